@@ -0,0 +1,26 @@
+"""003_add_job_input_mode
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "003"
+down_revision = "002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "jobs",
+        sa.Column("input_mode", sa.String(16), nullable=False, server_default="video"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("jobs", "input_mode")
@@ -0,0 +1,24 @@
+"""004_add_job_upload_meta
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision = "004"
+down_revision = "003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("jobs", sa.Column("upload_meta", JSONB, nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("jobs", "upload_meta")
@@ -40,6 +40,12 @@ class Job(Base):
     pref_length: Mapped[str | None] = mapped_column(String(16), nullable=True)
     pref_maintenance: Mapped[str | None] = mapped_column(String(16), nullable=True)
 
+    # Upload
+    input_mode: Mapped[str] = mapped_column(String(16), nullable=False, default="video")
+    # video | keyframes
+    upload_meta: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    # Probe result: size, container, duration, width, height, rotation, codec
+
     # S3 keys
     upload_s3_key: Mapped[str | None] = mapped_column(String(512), nullable=True)
     results_s3_key: Mapped[str | None] = mapped_column(String(512), nullable=True)
@@ -5,6 +5,7 @@ import uuid
 from datetime import datetime, timezone
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -19,9 +20,16 @@ from app.schemas.job_schemas import (
     StartJobResponse,
 )
 from app.schemas.result_schemas import BarberCard, JobResultsResponse, StyleResult
+from app.services.upload_probe import UploadRejected, probe_upload
 
 router = APIRouter(prefix="/v1/jobs", tags=["jobs"])
 
+# input_mode → (object name under uploads/{job_id}/, Content-Type)
+_UPLOAD_OBJECTS: dict[str, tuple[str, str]] = {
+    "video": ("video.mp4", "video/mp4"),
+    "keyframes": ("keyframes.zip", "application/zip"),
+}
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # POST /v1/jobs  — create job + presigned upload URL
@@ -32,7 +40,8 @@ async def create_job(
     db: AsyncSession = Depends(get_db),
 ):
     job_id = uuid.uuid4()
-    s3_key = f"uploads/{job_id}/video.mp4"
+    filename, content_type = _UPLOAD_OBJECTS[body.input_mode]
+    s3_key = f"uploads/{job_id}/{filename}"
 
     # Generate presigned PUT URL (MinIO)
     minio = get_minio_client()
@@ -42,7 +51,7 @@ async def create_job(
             Params={
                 "Bucket": settings.minio_bucket_uploads,
                 "Key": s3_key,
-                "ContentType": "video/mp4",
+                "ContentType": content_type,
             },
             ExpiresIn=settings.presigned_url_expiry_seconds,
         )
@@ -55,6 +64,7 @@ async def create_job(
         pref_gender=body.pref_gender,
         pref_length=body.pref_length,
         pref_maintenance=body.pref_maintenance,
+        input_mode=body.input_mode,
         upload_s3_key=s3_key,
     )
     db.add(job)
@@ -64,12 +74,13 @@ async def create_job(
         job_id=job_id,
         upload_url=upload_url,
         upload_key=s3_key,
+        upload_content_type=content_type,
         expires_in_seconds=settings.presigned_url_expiry_seconds,
     )
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# POST /v1/jobs/{id}/start  — enqueue to SQS
+# POST /v1/jobs/{id}/start  — probe upload, enqueue to SQS
 # ─────────────────────────────────────────────────────────────────────────────
 @router.post("/{job_id}/start", response_model=StartJobResponse)
 async def start_job(
@@ -84,6 +95,21 @@ async def start_job(
             detail=f"Job is already in status '{job.status}' and cannot be re-queued.",
         )
 
+    # Probe the upload (HEAD + ranged header reads) so unusable uploads never
+    # reach a worker. A rejected job stays pending and can be re-uploaded.
+    try:
+        job.upload_meta = await run_in_threadpool(
+            probe_upload,
+            get_minio_client(),
+            settings.minio_bucket_uploads,
+            job.upload_s3_key,
+            job.input_mode,
+        )
+    except UploadRejected as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=502, detail=f"Could not probe upload: {exc}")
+
     # Send SQS message
     sqs = get_sqs_client()
     try:
@@ -152,6 +178,8 @@ async def get_job_results(
             view_left=s["view_left"],
             view_right=s["view_right"],
             view_back=s["view_back"],
+            variants=s.get("variants", {}),
+            placeholders=s.get("placeholders", {}),
             barber_card=BarberCard(**s["barber_card"]),
         )
         for s in job.results_json
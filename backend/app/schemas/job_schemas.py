@@ -10,12 +10,15 @@ class CreateJobRequest(BaseModel):
     pref_gender: Literal["male", "female", "unisex"] | None = None
     pref_length: Literal["short", "medium", "long"] | None = None
     pref_maintenance: Literal["low", "medium", "high"] | None = None
+    # video: full MP4 upload | keyframes: zip of client-extracted JPEGs + manifest.json
+    input_mode: Literal["video", "keyframes"] = "video"
 
 
 class CreateJobResponse(BaseModel):
     job_id: uuid.UUID
     upload_url: str
     upload_key: str
+    upload_content_type: str = "video/mp4"
     expires_in_seconds: int
 
 
@@ -10,6 +10,14 @@ class BarberCard(BaseModel):
     top_length_cm: float | None = None
 
 
+class ImageVariant(BaseModel):
+    format: str
+    width: int
+    height: int
+    bytes: int
+    url: str
+
+
 class StyleResult(BaseModel):
     rank: int
     style_id: uuid.UUID
@@ -24,6 +32,10 @@ class StyleResult(BaseModel):
     view_left: str
     view_right: str
     view_back: str
+    # Per view: alternative encodings / sizes of the view_* PNGs
+    variants: dict[str, list[ImageVariant]] = {}
+    # Per view: BlurHash string for an instant blurred preview
+    placeholders: dict[str, str] = {}
     barber_card: BarberCard
 
 
@@ -0,0 +1,199 @@
+"""
+Probe an uploaded object before its job is enqueued.
+
+Only a HEAD request and a couple of ranged reads are made — the upload is
+never downloaded in full. For MP4/MOV videos the top-level ISO-BMFF boxes
+are walked until the moov box is found (it may sit behind mdat, in which case
+it is fetched with one more ranged read) and duration, display resolution,
+rotation and codec are read from mvhd / tkhd / stsd.
+
+Raises UploadRejected when the object is missing or unusable; the returned
+metadata is stored on the job so the worker can plan its decode without
+running ffprobe.
+"""
+from __future__ import annotations
+
+import math
+import struct
+
+from botocore.exceptions import ClientError
+
+from app.config import settings
+
+HEADER_BYTES = 64 * 1024   # first ranged read; covers ftyp + a front moov
+MAX_MOOV_BYTES = 8 * 2**20  # larger moov boxes are not worth fetching to probe
+MAX_TOP_LEVEL_BOXES = 16
+
+_ZIP_MAGIC = b"PK\x03\x04"
+_CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+
+class UploadRejected(ValueError):
+    """The upload is missing or cannot be processed."""
+
+
+def probe_upload(client, bucket: str, key: str, input_mode: str) -> dict:
+    """Metadata for s3://*bucket*/*key*; raises UploadRejected."""
+    try:
+        head = client.head_object(Bucket=bucket, Key=key)
+    except ClientError as exc:
+        code = exc.response.get("Error", {}).get("Code")
+        if code in ("404", "NoSuchKey", "NotFound"):
+            raise UploadRejected("Upload not found — PUT the file before starting the job.")
+        raise
+
+    size = int(head["ContentLength"])
+    meta = {"size": size, "content_type": head.get("ContentType")}
+    if size == 0:
+        raise UploadRejected("Upload is empty.")
+
+    if input_mode == "keyframes":
+        if size > settings.keyframes_max_bytes:
+            raise UploadRejected(f"Keyframe bundle is too large ({size} bytes).")
+        if _read_range(client, bucket, key, 0, 4) != _ZIP_MAGIC:
+            raise UploadRejected("Keyframe bundle is not a zip archive.")
+        meta["container"] = "zip"
+        return meta
+
+    if size < settings.video_min_bytes:
+        raise UploadRejected(f"Upload is too small to be a video ({size} bytes).")
+    if size > settings.video_max_bytes:
+        raise UploadRejected(f"Video is too large ({size} bytes).")
+
+    meta.update(_probe_mp4(client, bucket, key, size))
+    duration = meta.get("duration")
+    if duration is not None:
+        if duration < settings.video_min_duration_seconds:
+            raise UploadRejected(f"Video is too short ({duration:.1f}s).")
+        if duration > settings.video_max_duration_seconds:
+            raise UploadRejected(
+                f"Video is too long ({duration:.0f}s, max "
+                f"{settings.video_max_duration_seconds:g}s)."
+            )
+    return meta
+
+
+def _read_range(client, bucket: str, key: str, start: int, length: int) -> bytes:
+    resp = client.get_object(
+        Bucket=bucket, Key=key, Range=f"bytes={start}-{start + length - 1}"
+    )
+    return resp["Body"].read()
+
+
+# ── ISO-BMFF (MP4 / MOV) ──────────────────────────────────────────────────────
+
+def _box_header(data: bytes, pos: int = 0) -> tuple[bytes, int, int] | None:
+    """(type, header length, box size) of the box at data[pos:], if readable."""
+    if pos + 8 > len(data):
+        return None
+    size, box_type = struct.unpack_from(">I4s", data, pos)
+    if size == 1:
+        if pos + 16 > len(data):
+            return None
+        return box_type, 16, struct.unpack_from(">Q", data, pos + 8)[0]
+    return box_type, 8, size
+
+
+def _boxes(data: bytes, start: int = 0, end: int | None = None):
+    """Yield (type, payload_start, box_end) for the boxes in data[start:end]."""
+    end = len(data) if end is None else end
+    pos = start
+    while (box := _box_header(data, pos)) is not None and pos < end:
+        box_type, header, size = box
+        if size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            return
+        yield box_type, pos + header, pos + size
+        pos += size
+
+
+def _probe_mp4(client, bucket: str, key: str, size: int) -> dict:
+    head = _read_range(client, bucket, key, 0, min(HEADER_BYTES, size))
+    if len(head) < 8 or head[4:8] != b"ftyp":
+        raise UploadRejected("Upload is not an MP4/MOV video.")
+
+    # Walk the top-level boxes. Headers inside the first read come for free;
+    # past it (typically after mdat) each header costs one small ranged read.
+    pos = 0
+    for _ in range(MAX_TOP_LEVEL_BOXES):
+        if pos + 16 <= len(head):
+            box = _box_header(head, pos)
+        else:
+            box = _box_header(_read_range(client, bucket, key, pos, min(16, size - pos)))
+        if box is None:
+            break
+        box_type, header, box_size = box
+        if box_size == 0:
+            box_size = size - pos  # box runs to end of file
+        if box_size < header or pos + box_size > size:
+            break  # truncated upload
+        if box_type == b"moov":
+            if box_size > MAX_MOOV_BYTES:
+                break
+            if pos + box_size <= len(head):
+                moov = head[pos + header:pos + box_size]
+            else:
+                moov = _read_range(client, bucket, key, pos + header, box_size - header)
+            return _parse_moov(moov)
+        pos += box_size
+        if pos + 8 > size:
+            break
+    raise UploadRejected("Video is truncated — no moov box found.")
+
+
+def _parse_moov(moov: bytes) -> dict:
+    meta: dict = {"container": "mp4", "duration": None}
+    video = None
+    for box_type, payload, box_end in _boxes(moov):
+        if box_type == b"mvhd":
+            version = moov[payload]
+            if version == 1:
+                timescale, duration = struct.unpack_from(">IQ", moov, payload + 20)
+            else:
+                timescale, duration = struct.unpack_from(">II", moov, payload + 12)
+            if timescale and duration:
+                meta["duration"] = round(duration / timescale, 3)
+        elif box_type == b"trak" and video is None:
+            video = _parse_trak(moov, payload, box_end)
+
+    if video is None:
+        raise UploadRejected("Upload has no video track.")
+    meta.update(video)
+    return meta
+
+
+def _parse_trak(data: bytes, start: int, end: int) -> dict | None:
+    """Video track info, or None for audio/other tracks."""
+    found: dict = {}
+
+    def walk(s: int, e: int) -> None:
+        for box_type, payload, box_end in _boxes(data, s, e):
+            if box_type in _CONTAINER_BOXES:
+                walk(payload, box_end)
+            elif box_type == b"tkhd":
+                # matrix (36 bytes) then width, height as 16.16 fixed point
+                a, b = struct.unpack_from(">ii", data, box_end - 44)
+                w, h = struct.unpack_from(">II", data, box_end - 8)
+                found["rotation"] = int(round(math.degrees(math.atan2(b, a)))) % 360
+                found["width"], found["height"] = w >> 16, h >> 16
+            elif box_type == b"hdlr":
+                found["handler"] = data[payload + 8:payload + 12]
+            elif box_type == b"stsd":
+                # version/flags, entry count, then the first sample entry
+                found["codec"] = data[payload + 12:payload + 16].decode("latin-1")
+
+    walk(start, end)
+    if found.get("handler") != b"vide" or not found.get("width"):
+        return None
+
+    width, height = found["width"], found["height"]
+    if found["rotation"] % 180 == 90:
+        # Store the displayed size — ffmpeg auto-rotates on decode
+        width, height = height, width
+    return {
+        "width": width,
+        "height": height,
+        "rotation": found["rotation"],
+        "codec": found.get("codec"),
+    }
@@ -0,0 +1,86 @@
+"""
+Benchmark the vectorized refiner against the original per-view PIL one.
+
+  python -m benchmarks.bench_refiner [--styles 10] [--size 512]
+
+Both run on in-memory images for one job's worth of views (styles × 4), so
+the timing isolates the image work from PNG I/O. Also reports the largest
+per-pixel difference between the two outputs.
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance
+
+from pipeline.refiner import refine_images, vignette_mask
+
+
+# ── Original implementation (per view, mask redrawn every time) ─────────────
+
+def _legacy_vignette(w: int, h: int) -> Image.Image:
+    mask = Image.new("L", (w, h), 0)
+    draw = ImageDraw.Draw(mask)
+    cx, cy = w // 2, h // 2
+    max_r = math.sqrt(cx**2 + cy**2)
+    for r in range(int(max_r), 0, -1):
+        alpha = int(255 * (1 - (r / max_r) ** 2))
+        draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=alpha)
+    return mask
+
+
+def _legacy_refine(img: Image.Image) -> Image.Image:
+    img_rgb = ImageEnhance.Brightness(img.convert("RGB")).enhance(1.05)
+    vignette = _legacy_vignette(img_rgb.width, img_rgb.height)
+    return Image.composite(img_rgb, Image.new("RGB", img_rgb.size, (0, 0, 0)), vignette)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--styles", type=int, default=10)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    views = ["front", "left", "right", "back"]
+    jobs = [
+        {v: rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8) for v in views}
+        for _ in range(args.styles)
+    ]
+    pil_jobs = [{v: Image.fromarray(a) for v, a in style.items()} for style in jobs]
+
+    def run_legacy():
+        return [{v: _legacy_refine(img) for v, img in style.items()} for style in pil_jobs]
+
+    def run_vectorized():
+        return [refine_images(style) for style in jobs]
+
+    timings = {}
+    for name, fn in (("legacy", run_legacy), ("vectorized", run_vectorized)):
+        best = float("inf")
+        for _ in range(args.repeat):
+            vignette_mask.cache_clear()  # include the one-off mask build per job
+            t0 = time.perf_counter()
+            out = fn()
+            best = min(best, time.perf_counter() - t0)
+        timings[name] = (best, out)
+
+    n = args.styles * len(views)
+    for name, (seconds, _) in timings.items():
+        print(f"{name:>10}: {seconds * 1000:8.1f} ms for {n} views ({seconds / n * 1000:.2f} ms/view)")
+    print(f"   speed-up: {timings['legacy'][0] / timings['vectorized'][0]:.1f}×")
+
+    legacy, vectorized = timings["legacy"][1], timings["vectorized"][1]
+    diff = max(
+        int(np.abs(np.asarray(legacy[i][v], dtype=np.int16) - vectorized[i][v].astype(np.int16)).max())
+        for i in range(args.styles) for v in views
+    )
+    print(f"  max pixel difference: {diff}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,6 @@ from __future__ import annotations
 
 import json
 import os
-import shutil
 import threading
 import time
 import uuid
@@ -15,15 +14,21 @@ import boto3
 import psycopg2
 import psycopg2.extras
 
-from pipeline.downloader import download_video
+from pipeline.downloader import download_bytes, download_video, video_url
 from pipeline.face_analyzer import analyze_frames
-from pipeline.frame_extractor import extract_frames
-from pipeline.frame_selector import select_frames
-from pipeline.head_fitter import fit_head
-from pipeline.refiner import refine_views
-from pipeline.renderer import render_views
+from pipeline.frame_extractor import iter_frames
+from pipeline.frame_selector import NoFaceDetectedError, select_frames, select_frames_two_pass
+from pipeline.head_fitter import DECA_ENABLED, DECA_SERVER, fit_head
+from pipeline.keyframe_bundle import MAX_BUNDLE_BYTES, load_keyframes
+from pipeline.landmark_pool import get_landmark_pool
+from pipeline.landmarks import FACE_MESH_STATIC, FACE_MESH_VIDEO, LandmarkCache
+from pipeline.mesh_assets import get_mesh_assets
+from pipeline.model_registry import registry
+from pipeline.render_cache import get_render_cache
+from pipeline.renderer import RENDER_CACHE_ENABLED, render_images, render_stats
+from pipeline.style_pipeline import render_and_upload
 from pipeline.style_selector import select_styles
-from pipeline.uploader import upload_views
+from pipeline.uploader import upload_stats
 
 
 # ── Config ────────────────────────────────────────────────────────────────────
@@ -40,6 +45,15 @@ VISIBILITY_TIMEOUT = 1800  # 30 min
 HEARTBEAT_INTERVAL = 300   # 5 min
 WAIT_SECONDS = 20
 
+# Longest edge of decoded frames; larger uploads are downscaled by ffmpeg
+FRAME_MAX_SIDE = int(os.environ.get("FRAME_MAX_SIDE", "1280"))
+# two_pass: low-res scoring pass + full-res seek for winners | stream: one full-res pass
+FRAME_SELECTION = os.environ.get("FRAME_SELECTION", "two_pass").lower()
+# stream: ffmpeg reads the upload over a presigned URL | download: temp file first
+VIDEO_INPUT = os.environ.get("VIDEO_INPUT", "stream").lower()
+# Seconds of render-cache warm-up per empty SQS poll (0 or RENDER_CACHE_ENABLED=false disables)
+RENDER_WARM_UP_SECONDS = float(os.environ.get("RENDER_WARM_UP_SECONDS", "10"))
+
 
 def _sqs_client():
     return boto3.client(
@@ -117,6 +131,55 @@ def _heartbeat_thread(sqs, receipt_handle: str, stop_event: threading.Event):
 
 # ── Pipeline ──────────────────────────────────────────────────────────────────
 
+def _select_video_frames(
+    job_id: str,
+    s3_key: str,
+    upload_meta: dict,
+) -> tuple[list, LandmarkCache]:
+    # 1. Download (or just presign, when ffmpeg streams the upload itself)
+    if VIDEO_INPUT == "stream":
+        video_path = video_url(s3_key)
+    else:
+        print(f"[worker] [{job_id}] Downloading video")
+        video_path = download_video(s3_key)
+
+    # Probed by the API at start time — lets ffmpeg skip its own ffprobe
+    source_size = None
+    if upload_meta.get("width") and upload_meta.get("height"):
+        source_size = (int(upload_meta["width"]), int(upload_meta["height"]))
+
+    # 2–3. Decode frames in memory and select the best ones as they arrive
+    print(f"[worker] [{job_id}] Extracting and selecting frames")
+    landmarks = LandmarkCache()
+    try:
+        if FRAME_SELECTION == "two_pass":
+            frames = select_frames_two_pass(
+                video_path,
+                max_side=FRAME_MAX_SIDE,
+                landmarks=landmarks,
+                source_size=source_size,
+                duration=upload_meta.get("duration"),
+            )
+        else:
+            frames = select_frames(
+                iter_frames(video_path, max_side=FRAME_MAX_SIDE, source_size=source_size),
+                landmarks=landmarks,
+            )
+    finally:
+        if VIDEO_INPUT != "stream":
+            os.unlink(video_path)
+    return frames, landmarks
+
+
+def _select_keyframes(job_id: str, s3_key: str) -> tuple[list, LandmarkCache]:
+    # 1–3. Client already extracted keyframes — no ffmpeg, straight to selection
+    print(f"[worker] [{job_id}] Loading keyframe bundle")
+    keyframes = load_keyframes(download_bytes(s3_key, MAX_BUNDLE_BYTES), max_side=FRAME_MAX_SIDE)
+    landmarks = LandmarkCache()
+    frames = select_frames(keyframes, landmarks=landmarks, tracking=False)
+    return frames, landmarks
+
+
 def process_job(job_id: str):
     conn = _db_conn()
     try:
@@ -129,28 +192,21 @@ def process_job(job_id: str):
         pref_gender = job["pref_gender"]
         pref_length = job["pref_length"]
         pref_maintenance = job["pref_maintenance"]
+        input_mode = job.get("input_mode") or "video"
 
         _set_progress(conn, job_id, "processing", 5)
 
-        # 1. Download
-        print(f"[worker] [{job_id}] Downloading video")
-        video_path = download_video(s3_key)
-        _set_progress(conn, job_id, "processing", 15)
-
-        # 2. Extract frames
-        print(f"[worker] [{job_id}] Extracting frames")
-        all_frames = extract_frames(video_path)
-        os.unlink(video_path)
-        _set_progress(conn, job_id, "processing", 25)
-
-        # 3. Select best frames
-        print(f"[worker] [{job_id}] Selecting frames")
-        frames = select_frames(all_frames)
+        if input_mode == "keyframes":
+            frames, landmarks = _select_keyframes(job_id, s3_key)
+        else:
+            frames, landmarks = _select_video_frames(
+                job_id, s3_key, job.get("upload_meta") or {}
+            )
         _set_progress(conn, job_id, "processing", 35)
 
         # 4. Analyze face
         print(f"[worker] [{job_id}] Analyzing face")
-        analysis = analyze_frames(frames)
+        analysis = analyze_frames(frames, landmarks)
         _set_progress(conn, job_id, "processing", 50)
 
         # 5. Fit head (DECA)
@@ -158,11 +214,6 @@ def process_job(job_id: str):
         head_params = fit_head(frames)
         _set_progress(conn, job_id, "processing", 60)
 
-        # Cleanup frame files
-        frame_dir = os.path.dirname(frames[0]) if frames else None
-        if frame_dir and os.path.isdir(frame_dir):
-            shutil.rmtree(frame_dir, ignore_errors=True)
-
         # 6. Select styles
         print(f"[worker] [{job_id}] Selecting styles")
         styles = select_styles(
@@ -173,21 +224,31 @@ def process_job(job_id: str):
             hair_texture=analysis.hair_texture,
         )
         _set_progress(conn, job_id, "processing", 70)
+        get_render_cache().record_recommendations(
+            analysis.head_shape, {style.slug: style.mesh_s3_key for style in styles}
+        )
 
-        # 7. Render + upload each style
-        results_json = []
+        # 7. Render + refine + upload all styles as one pipeline
+        print(f"[worker] [{job_id}] Rendering {len(styles)} styles")
         progress_per_style = 25 // max(len(styles), 1)
+        all_views = render_and_upload(
+            job_id,
+            [style.slug for style in styles],
+            head={
+                "head_scale": head_params.scale,
+                "head_centroid": head_params.centroid,
+                "head_shape": head_params.shape,
+                "head_expression": head_params.expression,
+            },
+            on_style_done=lambda n: _set_progress(
+                conn, job_id, "processing", min(70 + n * progress_per_style, 95)
+            ),
+            mesh_keys=[style.mesh_s3_key for style in styles],
+        )
 
-        for rank, style in enumerate(styles, start=1):
-            print(f"[worker] [{job_id}] Rendering style {style.slug} ({rank}/{len(styles)})")
-            view_paths = render_views(
-                style_slug=style.slug,
-                head_scale=head_params.scale,
-                head_centroid=head_params.centroid,
-            )
-            refine_views(view_paths)
-            urls = upload_views(job_id, style.slug, view_paths)
-
+        results_json = []
+        for rank, (style, stored) in enumerate(zip(styles, all_views), start=1):
+            urls = {view: s.url for view, s in stored.items()}
             results_json.append({
                 "rank": rank,
                 "style_id": style.style_id,
@@ -202,17 +263,30 @@ def process_job(job_id: str):
                 "view_left": urls.get("left", ""),
                 "view_right": urls.get("right", ""),
                 "view_back": urls.get("back", ""),
+                # Content-addressed objects (results/cas/{digest}.png)
+                "view_digests": {view: s.digest for view, s in stored.items()},
+                # WebP / AVIF renditions per view (full size and thumbnail)
+                "variants": {view: s.variants for view, s in stored.items()},
+                # BlurHash per view, to paint a preview before any image loads
+                "placeholders": {view: s.placeholder for view, s in stored.items()},
                 "barber_card": {
                     "notes": style.barber_notes,
                     "guard": style.barber_guard,
                     "top_length_cm": style.top_length_cm,
                 },
             })
-            _set_progress(conn, job_id, "processing", min(70 + rank * progress_per_style, 95))
 
         _set_completed(conn, job_id, analysis.head_shape, results_json)
         print(f"[worker] [{job_id}] Completed — {len(results_json)} styles")
-
+        print(f"[worker] Render stats: {render_stats()}")
+        print(f"[worker] Render cache: {get_render_cache().report()}")
+        print(f"[worker] Uploads: {upload_stats()}")
+        print(f"[worker] Mesh assets: {get_mesh_assets().report()}")
+
+    except NoFaceDetectedError as exc:
+        # Retrying a hopeless upload won't help — fail it and ack the message
+        print(f"[worker] [{job_id}] REJECTED: {exc}")
+        _set_failed(conn, job_id, str(exc))
     except Exception as exc:
         print(f"[worker] [{job_id}] FAILED: {exc}")
         try:
@@ -226,7 +300,24 @@ def process_job(job_id: str):
 
 # ── Poll loop ─────────────────────────────────────────────────────────────────
 
+def _warm_up_render(slug: str, mesh_key: str | None) -> None:
+    """Warm-up render of one style on the default head, with its hair mesh."""
+    render_images(slug, mesh_key=mesh_key)
+
+
 def main():
+    # Build and warm the MediaPipe graphs once, before the first job arrives
+    registry.warm_up([FACE_MESH_STATIC, FACE_MESH_VIDEO])
+    landmark_pool = get_landmark_pool()
+    if landmark_pool is not None:
+        landmark_pool.warm_up()
+    if DECA_ENABLED:
+        # Start the DECA server now so model load isn't paid by the first job
+        try:
+            registry.warm_up([DECA_SERVER])
+        except Exception as exc:
+            print(f"[worker] DECA server failed to start: {exc} — will retry per job")
+
     print("[worker] Starting SQS poll loop")
     sqs = _sqs_client()
 
@@ -246,6 +337,13 @@ def main():
 
         messages = response.get("Messages", [])
         if not messages:
+            # Idle — pre-render popular styles (default head) into the cache;
+            # without the cache every idle poll would just re-render them
+            if RENDER_WARM_UP_SECONDS > 0 and RENDER_CACHE_ENABLED:
+                try:
+                    get_render_cache().warm_up(_warm_up_render, RENDER_WARM_UP_SECONDS)
+                except Exception as exc:
+                    print(f"[worker] Render warm-up failed: {exc}")
             continue
 
         msg = messages[0]
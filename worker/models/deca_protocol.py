@@ -0,0 +1,64 @@
+"""
+Wire format between head_fitter and the DECA server (models/deca_server.py).
+
+Each message on the unix socket is:
+
+  [4-byte big-endian header length][JSON header][raw array bytes ...]
+
+The header carries an "arrays" list of {name, dtype, shape}; the arrays
+follow back to back as C-order bytes, so images and parameters cross the
+socket without any JSON or pickle encoding. Only stdlib + NumPy are needed,
+so both the worker env and the PyTorch env can import this.
+"""
+from __future__ import annotations
+
+import json
+import socket
+import struct
+
+import numpy as np
+
+_LEN = struct.Struct(">I")
+
+
+def send_message(
+    sock: socket.socket,
+    header: dict,
+    arrays: dict[str, np.ndarray] | None = None,
+) -> None:
+    arrays = {name: np.ascontiguousarray(a) for name, a in (arrays or {}).items()}
+    header = {
+        **header,
+        "arrays": [
+            {"name": name, "dtype": a.dtype.str, "shape": list(a.shape)}
+            for name, a in arrays.items()
+        ],
+    }
+    raw = json.dumps(header).encode()
+    sock.sendall(_LEN.pack(len(raw)) + raw)
+    for a in arrays.values():
+        sock.sendall(memoryview(a).cast("B"))
+
+
+def recv_message(sock: socket.socket) -> tuple[dict, dict[str, np.ndarray]]:
+    (length,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+    header = json.loads(_recv_exact(sock, length))
+    arrays: dict[str, np.ndarray] = {}
+    for spec in header.pop("arrays", []):
+        dtype = np.dtype(spec["dtype"])
+        nbytes = int(np.prod(spec["shape"], dtype=np.int64)) * dtype.itemsize
+        buf = _recv_exact(sock, nbytes)
+        arrays[spec["name"]] = np.frombuffer(buf, dtype=dtype).reshape(spec["shape"])
+    return header, arrays
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytearray:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        chunk = sock.recv_into(view[got:], n - got)
+        if chunk == 0:
+            raise ConnectionError("DECA socket closed mid-message")
+        got += chunk
+    return buf
@@ -0,0 +1,109 @@
+"""
+Long-lived DECA inference server.
+
+Loads the model once and serves fit requests over a unix socket:
+  python deca_server.py --socket /tmp/deca.sock [--parent-pid PID]
+
+Started (and restarted after a crash) by head_fitter.DecaClient, in the same
+isolated PyTorch env run_deca.py uses. Messages follow models/deca_protocol:
+
+  {"op": "ping"}                          → {"ok": true, "backend": ..., "load_seconds": ...}
+  {"op": "fit"} + images N×224×224×3 u8  → {"ok": true} + shape/pose/expression/scale
+
+A failed request is answered with {"ok": false, "error": ...} and the server
+keeps running. It exits on its own once the parent worker has gone away.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.deca_protocol import recv_message, send_message  # noqa: E402
+from models.run_deca import DECA_BACKEND, encode, load_deca  # noqa: E402
+
+ACCEPT_TIMEOUT = 5.0  # seconds between parent-liveness checks
+
+
+def _parent_alive(pid: int | None) -> bool:
+    if pid is None:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _handle(conn: socket.socket, deca, load_seconds: float, load_error: str | None) -> None:
+    """Serve requests on one connection until the client hangs up."""
+    while True:
+        try:
+            header, arrays = recv_message(conn)
+        except ConnectionError:
+            return
+
+        op = header.get("op")
+        if op == "ping":
+            send_message(conn, {"ok": load_error is None, "load_seconds": load_seconds,
+                                "backend": DECA_BACKEND, "error": load_error})
+        elif op == "fit":
+            if load_error is not None:
+                send_message(conn, {"ok": False, "error": load_error})
+                continue
+            try:
+                t0 = time.monotonic()
+                codes = encode(deca, arrays["images"])
+                send_message(conn, {"ok": True, "seconds": time.monotonic() - t0}, codes)
+            except Exception as exc:
+                print(f"[deca_server] Fit failed: {exc}", file=sys.stderr)
+                send_message(conn, {"ok": False, "error": str(exc)})
+        else:
+            send_message(conn, {"ok": False, "error": f"Unknown op {op!r}"})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", required=True)
+    parser.add_argument("--parent-pid", type=int, default=None)
+    args = parser.parse_args()
+
+    t0 = time.monotonic()
+    deca, load_error = None, None
+    try:
+        deca = load_deca()
+    except Exception as exc:
+        load_error = f"DECA failed to load: {exc}"
+        print(f"[deca_server] {load_error}", file=sys.stderr)
+    load_seconds = time.monotonic() - t0
+    print(f"[deca_server] Model ({DECA_BACKEND}) ready in {load_seconds:.1f}s", flush=True)
+
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(args.socket)
+    server.listen(1)
+    server.settimeout(ACCEPT_TIMEOUT)
+
+    try:
+        while _parent_alive(args.parent_pid):
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            with conn:
+                conn.settimeout(None)
+                _handle(conn, deca, load_seconds, load_error)
+    finally:
+        server.close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
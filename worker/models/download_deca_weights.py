@@ -2,14 +2,30 @@
 Download DECA model weights from the S3 model-cache bucket.
 FLAME model weights require a separate manual upload (license-gated).
 
+The tarball is extracted straight from the S3 streaming body — nothing is
+staged on disk — and a manifest.json with the sha256 and size of every
+extracted file replaces the old ".downloaded" flag, so a partial or
+corrupted extraction is detected and redone. Each process extracts into its
+own temp directory that is renamed into DECA_LOCAL_DIR once complete, so
+workers starting together never write over each other's (memory-mapped)
+files.
+
+Files derived from the weights (the mmap-able checkpoint, the ONNX export)
+live outside DECA_LOCAL_DIR, in DECA_DERIVED_DIR/<weights digest> (see
+derived_dir()), so a re-install's rename does not delete them and new
+weights never pick up artifacts built from old ones. Installing new weights
+prunes the derived directories of other digests.
+
 Run this once before enabling DECA:
   python -m models.download_deca_weights
 """
 from __future__ import annotations
 
+import hashlib
+import json
 import os
+import shutil
 import tarfile
-import tempfile
 
 import boto3
 from botocore.config import Config
@@ -18,6 +34,12 @@ from botocore.config import Config
 DECA_WEIGHTS_BUCKET = os.environ.get("DECA_WEIGHTS_S3_BUCKET", "hairstyle-model-cache")
 DECA_WEIGHTS_KEY = os.environ.get("DECA_WEIGHTS_S3_KEY", "deca/deca_model.tar")
 DECA_LOCAL_DIR = os.path.expanduser("~/.deca_weights")
+DECA_DERIVED_DIR = f"{DECA_LOCAL_DIR}.derived"
+# true: re-hash every file on startup; otherwise only sizes are checked
+DECA_VERIFY_WEIGHTS = os.environ.get("DECA_VERIFY_WEIGHTS", "false").lower() == "true"
+
+MANIFEST_NAME = "manifest.json"
+_CHUNK = 1024 * 1024
 
 
 def _s3_client():
@@ -32,29 +54,150 @@ def _s3_client():
     )
 
 
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_manifest(local_dir: str = DECA_LOCAL_DIR, full: bool = DECA_VERIFY_WEIGHTS) -> bool:
+    """Whether every file in the manifest is present (and, if *full*, intact)."""
+    try:
+        with open(os.path.join(local_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if manifest.get("source") != f"s3://{DECA_WEIGHTS_BUCKET}/{DECA_WEIGHTS_KEY}":
+        return False
+
+    for rel, entry in manifest["files"].items():
+        path = os.path.join(local_dir, rel)
+        try:
+            if os.path.getsize(path) != entry["size"]:
+                return False
+        except OSError:
+            return False
+        if full and _sha256(path) != entry["sha256"]:
+            print(f"[deca_weights] Checksum mismatch for {rel}")
+            return False
+    return True
+
+
+def weights_digest(local_dir: str = DECA_LOCAL_DIR) -> str:
+    """Short digest of the installed weights, from the sha256 of every manifest file."""
+    with open(os.path.join(local_dir, MANIFEST_NAME)) as f:
+        files = json.load(f)["files"]
+    listing = json.dumps({rel: entry["sha256"] for rel, entry in files.items()}, sort_keys=True)
+    return hashlib.sha256(listing.encode()).hexdigest()[:16]
+
+
+def derived_dir(local_dir: str = DECA_LOCAL_DIR) -> str:
+    """Directory (created on demand) for files derived from the installed weights."""
+    path = os.path.join(DECA_DERIVED_DIR, weights_digest(local_dir))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _prune_derived(keep: str) -> None:
+    """Drop derived directories of weights other than digest *keep*."""
+    try:
+        names = os.listdir(DECA_DERIVED_DIR)
+    except OSError:
+        return
+    for name in names:
+        if name != keep:
+            # Open (memory-mapped) files stay valid until their users close them
+            shutil.rmtree(os.path.join(DECA_DERIVED_DIR, name), ignore_errors=True)
+
+
+def _safe_path(root: str, name: str) -> str | None:
+    """Destination for tar member *name*, or None if it escapes *root*."""
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([path, os.path.realpath(root)]) != os.path.realpath(root):
+        return None
+    return path
+
+
+def _extract_stream(fileobj, local_dir: str) -> dict[str, dict]:
+    """Extract a tar stream into *local_dir*, hashing files as they are written."""
+    files: dict[str, dict] = {}
+    # "r|*": sequential stream mode, any compression — no seeking needed
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+        for member in tar:
+            path = _safe_path(local_dir, member.name)
+            if path is None:
+                print(f"[deca_weights] Skipping unsafe member {member.name!r}")
+                continue
+            if member.isdir():
+                os.makedirs(path, exist_ok=True)
+                continue
+            if not member.isfile():
+                continue
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            src = tar.extractfile(member)
+            digest = hashlib.sha256()
+            with open(path, "wb") as out:
+                while chunk := src.read(_CHUNK):
+                    digest.update(chunk)
+                    out.write(chunk)
+            rel = os.path.relpath(path, local_dir)
+            files[rel] = {"sha256": digest.hexdigest(), "size": member.size}
+    return files
+
+
+def _install(tmp_dir: str) -> None:
+    """Rename a complete extraction into DECA_LOCAL_DIR, unless another worker won."""
+    if verify_manifest():
+        return
+    if os.path.exists(DECA_LOCAL_DIR):
+        # Partial or outdated: move it aside (open files stay valid) and drop it
+        stale = f"{DECA_LOCAL_DIR}.{os.getpid()}.stale"
+        try:
+            os.rename(DECA_LOCAL_DIR, stale)
+        except FileNotFoundError:
+            pass
+        else:
+            shutil.rmtree(stale, ignore_errors=True)
+    try:
+        os.rename(tmp_dir, DECA_LOCAL_DIR)
+    except OSError:
+        # Another worker renamed its copy in first
+        if not verify_manifest():
+            raise
+        return
+    _prune_derived(keep=weights_digest())
+
+
 def download_if_needed() -> str:
-    """Download weights tarball and extract. Returns local directory path."""
-    flag = os.path.join(DECA_LOCAL_DIR, ".downloaded")
-    if os.path.exists(flag):
+    """Stream-extract the weights tarball unless intact. Returns local directory path."""
+    if verify_manifest():
         print(f"[deca_weights] Already downloaded at {DECA_LOCAL_DIR}")
         return DECA_LOCAL_DIR
 
-    os.makedirs(DECA_LOCAL_DIR, exist_ok=True)
-    client = _s3_client()
-
-    with tempfile.NamedTemporaryFile(suffix=".tar", delete=False) as tmp:
-        tar_path = tmp.name
-
-    print(f"[deca_weights] Downloading s3://{DECA_WEIGHTS_BUCKET}/{DECA_WEIGHTS_KEY} ...")
-    client.download_file(DECA_WEIGHTS_BUCKET, DECA_WEIGHTS_KEY, tar_path)
-
-    print(f"[deca_weights] Extracting to {DECA_LOCAL_DIR} ...")
-    with tarfile.open(tar_path) as tar:
-        tar.extractall(DECA_LOCAL_DIR)
-
-    os.unlink(tar_path)
-    open(flag, "w").close()
-    print("[deca_weights] Done.")
+    # Extract into a per-process directory and rename it into place, so files
+    # another worker already has memory-mapped are never rewritten
+    tmp_dir = f"{DECA_LOCAL_DIR}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    print(f"[deca_weights] Streaming s3://{DECA_WEIGHTS_BUCKET}/{DECA_WEIGHTS_KEY} → {DECA_LOCAL_DIR} ...")
+    try:
+        body = _s3_client().get_object(Bucket=DECA_WEIGHTS_BUCKET, Key=DECA_WEIGHTS_KEY)["Body"]
+        try:
+            files = _extract_stream(body, tmp_dir)
+        finally:
+            body.close()
+
+        manifest = {"source": f"s3://{DECA_WEIGHTS_BUCKET}/{DECA_WEIGHTS_KEY}", "files": files}
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=2)
+        _install(tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    print(f"[deca_weights] Done ({len(files)} files).")
     return DECA_LOCAL_DIR
 
 
@@ -0,0 +1,119 @@
+"""
+Export DECA's FLAME encoder (E_flame) to ONNX for DECA_BACKEND=onnx.
+
+  python -m models.export_deca_onnx --images <dir> [--no-quantize]
+
+Writes deca_encoder.onnx and, unless --no-quantize, a dynamically
+int8-quantized deca_encoder.int8.onnx into the weights' derived_dir(),
+where DECA_BACKEND=onnx finds it by default. Both are
+checked against eager PyTorch on the images in --images (a fixed set of
+face crops); the per-code error is printed and the script exits non-zero
+if the deployed model exceeds --max-error on the shape code.
+Runs in the DECA (PyTorch) env and needs onnx + onnxruntime.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.download_deca_weights import derived_dir  # noqa: E402
+from models.run_deca import DECA_INPUT_SIZE, ONNX_MODEL, OnnxEncoder, decompose, load_deca  # noqa: E402
+
+OPSET = 17
+CHECKED_CODES = ("shape", "exp", "pose", "cam")
+
+
+def export(deca, path: str) -> None:
+    import torch
+
+    encoder = deca.E_flame.eval()
+    dummy = torch.rand(1, 3, DECA_INPUT_SIZE, DECA_INPUT_SIZE)
+    torch.onnx.export(
+        encoder,
+        dummy,
+        path,
+        input_names=["images"],
+        output_names=["parameters"],
+        dynamic_axes={"images": {0: "batch"}, "parameters": {0: "batch"}},
+        opset_version=OPSET,
+    )
+    print(f"[export_deca_onnx] Wrote {path} ({os.path.getsize(path) / 2**20:.1f} MiB)")
+
+
+def quantize(src: str, dst: str) -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(src, dst, weight_type=QuantType.QInt8)
+    print(f"[export_deca_onnx] Wrote {dst} ({os.path.getsize(dst) / 2**20:.1f} MiB)")
+
+
+def load_images(image_dir: str) -> np.ndarray:
+    """N×3×224×224 float32 batch from every image in *image_dir*, name order."""
+    import cv2
+
+    batch = []
+    for name in sorted(os.listdir(image_dir)):
+        img = cv2.imread(os.path.join(image_dir, name))
+        if img is None:
+            continue
+        img = cv2.resize(cv2.cvtColor(img, cv2.COLOR_BGR2RGB), (DECA_INPUT_SIZE, DECA_INPUT_SIZE))
+        batch.append(img.transpose(2, 0, 1))
+    if not batch:
+        raise SystemExit(f"No images found in {image_dir}")
+    return np.stack(batch).astype(np.float32) / 255.0
+
+
+def compare(deca, path: str, images: np.ndarray) -> dict[str, tuple[float, float]]:
+    """(max abs error, mean abs error) per code of *path* vs eager PyTorch."""
+    import torch
+
+    with torch.no_grad():
+        reference = decompose(deca.E_flame(torch.from_numpy(images)).numpy())
+    onnx_codes = decompose(OnnxEncoder(path)(images))
+
+    errors = {}
+    for name in CHECKED_CODES:
+        diff = np.abs(onnx_codes[name] - reference[name])
+        errors[name] = (float(diff.max()), float(diff.mean()))
+        print(
+            f"[export_deca_onnx] {os.path.basename(path)} {name:>5}: "
+            f"max {errors[name][0]:.5f}, mean {errors[name][1]:.5f}"
+        )
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", required=True, help="directory of face images for the accuracy check")
+    parser.add_argument("--output-dir", help="default: the installed weights' derived_dir()")
+    parser.add_argument("--no-quantize", action="store_true")
+    parser.add_argument("--max-error", type=float, default=0.05, help="max abs error allowed on shape codes")
+    args = parser.parse_args()
+
+    deca = load_deca("torch")
+    images = load_images(args.images)
+    output_dir = args.output_dir or derived_dir()
+
+    fp32_path = os.path.join(output_dir, "deca_encoder.onnx")
+    export(deca, fp32_path)
+    deployed, errors = fp32_path, compare(deca, fp32_path, images)
+
+    if not args.no_quantize:
+        deployed = os.path.join(output_dir, ONNX_MODEL)
+        quantize(fp32_path, deployed)
+        errors = compare(deca, deployed, images)
+
+    shape_error = errors["shape"][0]
+    if shape_error > args.max_error:
+        print(f"[export_deca_onnx] Shape error {shape_error:.5f} exceeds budget {args.max_error}")
+        sys.exit(1)
+    print(f"[export_deca_onnx] {os.path.basename(deployed)} within error budget — "
+          f"set DECA_BACKEND=onnx DECA_ONNX_PATH={deployed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,21 @@
 """
-Subprocess entry-point for DECA inference.
-Called by head_fitter.py:
+DECA inference helpers, plus a one-shot CLI:
   python run_deca.py --image <path> --output <json_path>
 
-This script runs in its own Python env to isolate PyTorch versions.
+load_deca() / encode() are shared with the long-lived server
+(models/deca_server.py) that head_fitter talks to. Both run in their own
+Python env to isolate PyTorch versions.
+
+With the torch backend the checkpoint is converted once into a zip-format
+torch.save file (deca_model.mmap.pt, in the weights' derived_dir()) and loaded with torch.load(mmap=True)
+plus load_state_dict(assign=True): parameters stay backed by the file's
+page-cache pages, so every worker process on a node shares one copy.
+
+DECA_BACKEND selects how the FLAME encoder runs:
+  torch — eager PyTorch on CPU (default)
+  onnx  — onnxruntime on the model exported by models/export_deca_onnx.py
+          (optionally int8-quantized), with DECA_ONNX_THREADS intra-op threads;
+          DECA_ONNX_PATH defaults to deca_encoder.int8.onnx in derived_dir()
 """
 from __future__ import annotations
 
@@ -12,12 +24,156 @@ import json
 import os
 import sys
 
-# Download weights if needed
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from models.download_deca_weights import download_if_needed  # noqa: E402
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.download_deca_weights import derived_dir, download_if_needed  # noqa: E402
+
+DECA_INPUT_SIZE = 224
+
+DECA_BACKEND = os.environ.get("DECA_BACKEND", "torch").lower()
+DECA_ONNX_PATH = os.environ.get("DECA_ONNX_PATH")  # default: ONNX_MODEL in derived_dir()
+ONNX_MODEL = "deca_encoder.int8.onnx"
+DECA_ONNX_THREADS = int(os.environ.get("DECA_ONNX_THREADS", "0"))  # 0 = onnxruntime default
+
+MMAP_CHECKPOINT = "deca_model.mmap.pt"  # in derived_dir()
+_MODULES = ("E_flame", "E_detail", "D_detail")
+
+# Layout of the E_flame output vector (DECA cfg.model.param_list)
+PARAM_LIST = [
+    ("shape", 100),
+    ("tex", 50),
+    ("exp", 50),
+    ("pose", 6),
+    ("cam", 3),
+    ("light", 27),
+]
+
+STUB_PARAMS = {
+    "shape": [0.0] * 100,
+    "pose": [0.0] * 6,
+    "expression": [0.0] * 50,
+    "scale": 1.0,
+    "centroid": [0.0, 0.0, 0.0],
+}
+
+
+class OnnxEncoder:
+    """DECA's FLAME encoder (E_flame) running in onnxruntime."""
+
+    def __init__(self, path: str | None = DECA_ONNX_PATH, threads: int = DECA_ONNX_THREADS):
+        import onnxruntime as ort
+
+        path = path or os.path.join(derived_dir(), ONNX_MODEL)
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, images: np.ndarray) -> np.ndarray:
+        """N×3×224×224 float32 in [0, 1] → N×236 parameter vectors."""
+        return self.session.run(None, {self.input_name: images})[0]
+
+
+def load_deca(backend: str = DECA_BACKEND):
+    """Download weights if needed and build the DECA encoder (CPU)."""
+    if backend == "onnx":
+        download_if_needed()
+        return OnnxEncoder()
+
+    deca_dir = download_if_needed()
+    if deca_dir not in sys.path:
+        sys.path.insert(0, deca_dir)
+
+    # DECA imports — only available when weights are present
+    from decalib.deca import DECA  # type: ignore
+    from decalib.utils.config import cfg as deca_cfg  # type: ignore
+
+    # Work on a copy: the module-level cfg must keep its checkpoint path for
+    # any later load_deca() in this process
+    cfg = deca_cfg.clone()
+    cfg.model.use_tex = False
+    try:
+        mmap_path = _mmap_checkpoint(cfg.pretrained_modelpath)
+    except Exception as exc:
+        print(f"[run_deca] mmap checkpoint unavailable ({exc}) — loading eagerly", file=sys.stderr)
+        return DECA(config=cfg, device="cpu")
+
+    import torch
+
+    # Build the modules without DECA's own (copying) checkpoint load, then
+    # point their parameters at the memory-mapped tensors
+    cfg.pretrained_modelpath = ""
+    deca = DECA(config=cfg, device="cpu")
+    checkpoint = torch.load(mmap_path, mmap=True, weights_only=True, map_location="cpu")
+    missing = [name for name in _MODULES if hasattr(deca, name) and name not in checkpoint]
+    if missing:
+        raise RuntimeError(f"DECA checkpoint {mmap_path} has no weights for {', '.join(missing)}")
+    for name in _MODULES:
+        if hasattr(deca, name):
+            getattr(deca, name).load_state_dict(checkpoint[name], strict=True, assign=True)
+    deca.eval()
+    return deca
+
+
+def _mmap_checkpoint(src: str) -> str:
+    """Convert DECA's checkpoint once into an mmap-able file; returns its path."""
+    path = os.path.join(derived_dir(), MMAP_CHECKPOINT)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(src):
+        return path
+
+    import torch
+
+    print(f"[run_deca] Converting {src} → {path}", file=sys.stderr)
+    checkpoint = torch.load(src, map_location="cpu")
+    state = {
+        name: {k: v.contiguous() for k, v in checkpoint[name].items()}
+        for name in _MODULES if name in checkpoint
+    }
+    # Per-process temp name + atomic rename: workers may race on first start
+    tmp = f"{path}.{os.getpid()}.tmp"
+    torch.save(state, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def decompose(parameters: np.ndarray) -> dict[str, np.ndarray]:
+    """Split N×236 E_flame output into named codes, as DECA.decompose_code does."""
+    codes: dict[str, np.ndarray] = {}
+    start = 0
+    for name, size in PARAM_LIST:
+        codes[name] = parameters[:, start:start + size]
+        start += size
+    return codes
+
+
+def encode(deca, images: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Encode N×224×224×3 RGB uint8 images. Returns float32 arrays
+    shape (N×100), pose (N×6), expression (N×50) and scale (N).
+    """
+    batch = np.ascontiguousarray(images.transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
 
-deca_dir = download_if_needed()
-sys.path.insert(0, deca_dir)
+    if isinstance(deca, OnnxEncoder):
+        codedict = decompose(deca(batch))
+    else:
+        import torch
+
+        with torch.no_grad():
+            codedict = {
+                k: v.numpy() for k, v in deca.encode(torch.from_numpy(batch)).items()
+                if k in ("shape", "exp", "pose", "cam")
+            }
+
+    return {
+        "shape": codedict["shape"].astype(np.float32),
+        "pose": codedict["pose"].astype(np.float32),
+        "expression": codedict["exp"].astype(np.float32),
+        "scale": codedict["cam"][:, 0].astype(np.float32),
+    }
 
 
 def main():
@@ -27,43 +183,27 @@ def main():
     args = parser.parse_args()
 
     try:
-        # DECA imports — only available when weights are present
-        from decalib.deca import DECA  # type: ignore
-        from decalib.utils.config import cfg as deca_cfg  # type: ignore
-        import torch
-        import numpy as np
         import cv2
 
-        deca_cfg.model.use_tex = False
-        deca = DECA(config=deca_cfg, device="cpu")
+        deca = load_deca()
 
         img = cv2.imread(args.image)
         img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
         # Resize to DECA expected input
-        img_resized = cv2.resize(img_rgb, (224, 224))
-        tensor = torch.tensor(img_resized).permute(2, 0, 1).float() / 255.0
-        tensor = tensor.unsqueeze(0)
-
-        with torch.no_grad():
-            codedict = deca.encode(tensor)
+        img_resized = cv2.resize(img_rgb, (DECA_INPUT_SIZE, DECA_INPUT_SIZE))
+        codes = encode(deca, img_resized[None])
 
         params = {
-            "shape": codedict["shape"][0].tolist(),
-            "pose": codedict["pose"][0].tolist(),
-            "expression": codedict["exp"][0].tolist(),
-            "scale": float(codedict.get("cam", torch.ones(1, 3))[0, 0]),
+            "shape": codes["shape"][0].tolist(),
+            "pose": codes["pose"][0].tolist(),
+            "expression": codes["expression"][0].tolist(),
+            "scale": float(codes["scale"][0]),
             "centroid": [0.0, 0.0, 0.0],
         }
     except Exception as exc:
         print(f"[run_deca] Error: {exc} — writing stub", file=sys.stderr)
-        params = {
-            "shape": [0.0] * 100,
-            "pose": [0.0] * 6,
-            "expression": [0.0] * 50,
-            "scale": 1.0,
-            "centroid": [0.0, 0.0, 0.0],
-        }
+        params = STUB_PARAMS
 
     with open(args.output, "w") as f:
         json.dump(params, f)
@@ -1,4 +1,13 @@
-"""Download the uploaded video from MinIO."""
+"""
+Fetch the uploaded video from MinIO.
+
+  - video_url()      — presigned GET URL that ffmpeg reads directly over HTTP
+                       (ranged requests), so decoding overlaps the transfer and
+                       no local copy is made.
+  - download_video() — full download to a temp file (legacy).
+  - download_bytes() — small objects (keyframe bundles) straight into memory,
+                       streamed in chunks and cut off at a byte limit.
+"""
 from __future__ import annotations
 
 import os
@@ -7,26 +16,49 @@ import tempfile
 import boto3
 from botocore.config import Config
 
+# Must outlive the whole decode, including the second seek pass
+VIDEO_URL_EXPIRY = int(os.environ.get("VIDEO_URL_EXPIRY", "1800"))
+_CHUNK_BYTES = 1 << 20
 
-def download_video(s3_key: str) -> str:
-    """
-    Download *s3_key* from the MinIO uploads bucket.
-    Returns the path to a temp file (caller must delete).
-    """
-    minio_endpoint = os.environ.get("MINIO_ENDPOINT", "http://minio:9000")
-    minio_access = os.environ.get("MINIO_ACCESS_KEY", "minioadmin")
-    minio_secret = os.environ.get("MINIO_SECRET_KEY", "minioadmin")
-    bucket = os.environ.get("MINIO_BUCKET_UPLOADS", "hairstyle-uploads")
 
-    client = boto3.client(
+def _s3_client():
+    return boto3.client(
         "s3",
-        endpoint_url=minio_endpoint,
-        aws_access_key_id=minio_access,
-        aws_secret_access_key=minio_secret,
+        endpoint_url=os.environ.get("MINIO_ENDPOINT", "http://minio:9000"),
+        aws_access_key_id=os.environ.get("MINIO_ACCESS_KEY", "minioadmin"),
+        aws_secret_access_key=os.environ.get("MINIO_SECRET_KEY", "minioadmin"),
         region_name="us-east-1",
         config=Config(signature_version="s3v4"),
     )
 
+
+def _bucket() -> str:
+    return os.environ.get("MINIO_BUCKET_UPLOADS", "hairstyle-uploads")
+
+
+def video_url(s3_key: str) -> str:
+    """
+    Presigned GET URL for *s3_key* in the MinIO uploads bucket.
+    ffmpeg seeks inside the object with HTTP range requests, which also works
+    for MP4s whose moov atom sits at the end of the file.
+    """
+    bucket = _bucket()
+    print(f"[downloader] Streaming s3://{bucket}/{s3_key}")
+    return _s3_client().generate_presigned_url(
+        "get_object",
+        Params={"Bucket": bucket, "Key": s3_key},
+        ExpiresIn=VIDEO_URL_EXPIRY,
+    )
+
+
+def download_video(s3_key: str) -> str:
+    """
+    Download *s3_key* from the MinIO uploads bucket.
+    Returns the path to a temp file (caller must delete).
+    """
+    bucket = _bucket()
+    client = _s3_client()
+
     suffix = os.path.splitext(s3_key)[-1] or ".mp4"
     tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
     tmp.close()
@@ -34,3 +66,30 @@ def download_video(s3_key: str) -> str:
     print(f"[downloader] Downloading s3://{bucket}/{s3_key} → {tmp.name}")
     client.download_file(bucket, s3_key, tmp.name)
     return tmp.name
+
+
+def download_bytes(s3_key: str, max_bytes: int | None = None) -> bytes:
+    """
+    Read *s3_key* from the MinIO uploads bucket into memory. With
+    *max_bytes*, raises ValueError as soon as the object is known to be
+    larger — from its Content-Length, or while streaming the body — so an
+    oversized upload is never held in memory.
+    """
+    bucket = _bucket()
+    print(f"[downloader] Fetching s3://{bucket}/{s3_key}")
+    response = _s3_client().get_object(Bucket=bucket, Key=s3_key)
+    body = response["Body"]
+    try:
+        if max_bytes is None:
+            return body.read()
+        length = response.get("ContentLength")
+        if length is not None and length > max_bytes:
+            raise ValueError(f"s3://{bucket}/{s3_key} is too large ({length} bytes)")
+        data = bytearray()
+        while chunk := body.read(min(_CHUNK_BYTES, max_bytes + 1 - len(data))):
+            data += chunk
+            if len(data) > max_bytes:
+                raise ValueError(f"s3://{bucket}/{s3_key} is larger than {max_bytes} bytes")
+        return bytes(data)
+    finally:
+        body.close()
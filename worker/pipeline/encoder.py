@@ -0,0 +1,97 @@
+"""
+Output encoding for result views.
+
+Every view is uploaded as the canonical lossless PNG (the view_* URLs) plus
+one variant per RESULT_FORMATS × RESULT_SIZES combination — by default WebP
+at full size and as a thumbnail. AVIF is produced only when the installed
+Pillow can encode it.
+"""
+from __future__ import annotations
+
+import io
+import os
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image, features
+
+RESULT_FORMATS = [
+    f.strip().lower()
+    for f in os.environ.get("RESULT_FORMATS", "webp").split(",")
+    if f.strip()
+]
+RESULT_SIZES = [
+    int(s) for s in os.environ.get("RESULT_SIZES", "512,128").split(",") if s.strip()
+]
+WEBP_QUALITY = int(os.environ.get("WEBP_QUALITY", "80"))
+AVIF_QUALITY = int(os.environ.get("AVIF_QUALITY", "60"))
+
+# format → (Pillow format name, file extension, Content-Type)
+_FORMATS = {
+    "png": ("PNG", "png", "image/png"),
+    "webp": ("WEBP", "webp", "image/webp"),
+    "avif": ("AVIF", "avif", "image/avif"),
+}
+
+
+@dataclass
+class EncodedImage:
+    format: str
+    width: int
+    height: int
+    body: bytes
+
+    @property
+    def extension(self) -> str:
+        return _FORMATS[self.format][1]
+
+    @property
+    def content_type(self) -> str:
+        return _FORMATS[self.format][2]
+
+
+def _supported(fmt: str) -> bool:
+    if fmt not in _FORMATS:
+        return False
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # unknown-feature warning on old Pillow
+        return fmt == "png" or bool(features.check(fmt))
+
+
+_ENABLED_FORMATS = [f for f in RESULT_FORMATS if _supported(f)]
+for _fmt in sorted(set(RESULT_FORMATS) - set(_ENABLED_FORMATS)):
+    print(f"[encoder] Format '{_fmt}' not supported by this Pillow build — skipping")
+
+
+def _encode(img: Image.Image, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "webp":
+        img.save(buf, format="WEBP", quality=WEBP_QUALITY, method=4)
+    elif fmt == "avif":
+        img.save(buf, format="AVIF", quality=AVIF_QUALITY)
+    else:
+        img.save(buf, format=_FORMATS[fmt][0])
+    return buf.getvalue()
+
+
+def encode_png(image: np.ndarray) -> EncodedImage:
+    h, w = image.shape[:2]
+    return EncodedImage("png", w, h, _encode(Image.fromarray(image), "png"))
+
+
+def encode_variants(image: np.ndarray) -> list[EncodedImage]:
+    """The configured format × size variants of *image*, largest first."""
+    base = Image.fromarray(image)
+    variants: list[EncodedImage] = []
+    for size in sorted(set(RESULT_SIZES), reverse=True):
+        img = base
+        if max(base.size) > size:
+            factor = size / max(base.size)
+            img = base.resize(
+                (max(1, round(base.width * factor)), max(1, round(base.height * factor))),
+                Image.LANCZOS,
+            )
+        for fmt in _ENABLED_FORMATS:
+            variants.append(EncodedImage(fmt, img.width, img.height, _encode(img, fmt)))
+    return variants
@@ -1,5 +1,5 @@
 """
-Analyze selected frames with MediaPipe FaceMesh.
+Analyze selected frames with MediaPipe FaceMesh landmarks.
 Outputs:
   - head_shape: oval | round | square | heart | oblong | diamond
   - hair_texture: straight | wavy | curly | coily
@@ -7,13 +7,20 @@ Outputs:
 """
 from __future__ import annotations
 
-import statistics
 from dataclasses import dataclass, field
 
-import cv2
-import mediapipe as mp
 import numpy as np
 
+from pipeline.frame_extractor import Frame
+from pipeline.landmark_pool import get_landmark_pool
+from pipeline.landmarks import (
+    FACE_MESH_STATIC,
+    LandmarkCache,
+    face_dimensions,
+    landmark_frame,
+)
+from pipeline.model_registry import registry
+
 
 @dataclass
 class FaceAnalysis:
@@ -22,18 +29,6 @@ class FaceAnalysis:
     features: dict = field(default_factory=dict)
 
 
-# Landmark indices for key measurements
-_FOREHEAD_TOP = 10
-_CHIN_BOTTOM = 152
-_LEFT_CHEEK = 234
-_RIGHT_CHEEK = 454
-_JAW_LEFT = 172
-_JAW_RIGHT = 397
-_LEFT_EYE_OUTER = 263
-_RIGHT_EYE_OUTER = 33
-_NOSE_TIP = 4
-
-
 def _face_shape(face_height: float, face_width: float, jaw_width: float) -> str:
     ratio = face_height / max(face_width, 1e-6)
     jaw_ratio = jaw_width / max(face_width, 1e-6)
@@ -51,57 +46,45 @@ def _face_shape(face_height: float, face_width: float, jaw_width: float) -> str:
     return "oval"
 
 
-def _lm_xy(lm, idx: int, w: int, h: int) -> np.ndarray:
-    p = lm[idx]
-    return np.array([p.x * w, p.y * h])
-
-
-def analyze_frames(frame_paths: list[str]) -> FaceAnalysis:
-    mp_face_mesh = mp.solutions.face_mesh
-    face_mesh = mp_face_mesh.FaceMesh(
-        static_image_mode=True,
-        max_num_faces=1,
-        refine_landmarks=True,
-        min_detection_confidence=0.5,
-    )
-
-    ratios: list[float] = []
-    jaw_ratios: list[float] = []
-
-    for path in frame_paths:
-        img = cv2.imread(path)
-        if img is None:
-            continue
-        h, w = img.shape[:2]
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        result = face_mesh.process(rgb)
-        if not result.multi_face_landmarks:
-            continue
-
-        lm = result.multi_face_landmarks[0].landmark
-        top = _lm_xy(lm, _FOREHEAD_TOP, w, h)
-        bot = _lm_xy(lm, _CHIN_BOTTOM, w, h)
-        left = _lm_xy(lm, _LEFT_CHEEK, w, h)
-        right = _lm_xy(lm, _RIGHT_CHEEK, w, h)
-        jaw_l = _lm_xy(lm, _JAW_LEFT, w, h)
-        jaw_r = _lm_xy(lm, _JAW_RIGHT, w, h)
-
-        face_h = float(np.linalg.norm(top - bot))
-        face_w = float(np.linalg.norm(left - right))
-        jaw_w = float(np.linalg.norm(jaw_l - jaw_r))
-
-        if face_w > 10 and face_h > 10:
-            ratios.append(face_h / face_w)
-            jaw_ratios.append(jaw_w / face_w)
-
-    face_mesh.close()
-
-    if not ratios:
+def analyze_frames(frames: list[Frame], landmarks: LandmarkCache | None = None) -> FaceAnalysis:
+    """
+    Measure face proportions on *frames*. Landmarks already computed during
+    frame selection are reused from *landmarks*; FaceMesh only runs for
+    frames the cache has not seen.
+    """
+    cache = landmarks if landmarks is not None else LandmarkCache()
+
+    missing = [f for f in frames if f.index not in cache]
+    pool = get_landmark_pool()
+    if missing and pool is not None:
+        # One parallel batch per frame size
+        by_shape: dict[tuple, list[Frame]] = {}
+        for frame in missing:
+            by_shape.setdefault(frame.image.shape, []).append(frame)
+        for group in by_shape.values():
+            for frame, points in zip(group, pool.landmark([f.image for f in group])):
+                h, w = frame.image.shape[:2]
+                cache.put(frame.index, points, (w, h))
+    elif missing:
+        with registry.borrow(FACE_MESH_STATIC) as face_mesh:
+            for frame in missing:
+                landmark_frame(cache, frame.index, frame.image, face_mesh)
+
+    indices = [f.index for f in frames if cache.has_face(f.index)]
+    if indices:
+        face_h, face_w, jaw_w = face_dimensions(cache.pixels(indices))
+        valid = (face_w > 10) & (face_h > 10)
+        ratios = face_h[valid] / face_w[valid]
+        jaw_ratios = jaw_w[valid] / face_w[valid]
+    else:
+        ratios = jaw_ratios = np.empty(0, dtype=np.float32)
+
+    if not len(ratios):
         print("[face_analyzer] No faces detected — defaulting to oval")
         return FaceAnalysis(head_shape="oval")
 
-    avg_ratio = statistics.mean(ratios)
-    avg_jaw = statistics.mean(jaw_ratios)
+    avg_ratio = float(ratios.mean())
+    avg_jaw = float(jaw_ratios.mean())
     shape = _face_shape(avg_ratio * 100, 100, avg_jaw * 100)
 
     print(f"[face_analyzer] head_shape={shape} (h/w={avg_ratio:.2f}, jaw/w={avg_jaw:.2f})")
@@ -1,10 +1,44 @@
-"""Extract frames from video at 1 fps using ffmpeg-python."""
+"""
+Extract frames from video at 1 fps using ffmpeg-python.
+
+Modes:
+  - extract_frames()   — writes every frame as a PNG into a temp dir (legacy).
+  - iter_frames()      — pipes raw frames from ffmpeg straight into NumPy arrays,
+                         no intermediate files. Only frames that still need a
+                         file later on are written with save_frames().
+  - decode_frames_at() — seeks and decodes single full-res frames at chosen
+                         timestamps (second pass of two-pass selection).
+"""
 from __future__ import annotations
 
 import os
+import queue
 import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Iterator
 
+import cv2
 import ffmpeg
+import numpy as np
+
+# Max decoded frames buffered ahead of the consumer
+FRAME_BUFFER = int(os.environ.get("FRAME_BUFFER", "4"))
+
+_CHANNELS = {"rgb24": 3, "gray": 1}
+
+# Extra input options when ffmpeg streams straight from a (presigned) URL
+_HTTP_INPUT_ARGS = {"reconnect": 1, "reconnect_on_network_error": 1, "reconnect_delay_max": 5}
+
+
+@dataclass
+class Frame:
+    """A single decoded frame held in memory."""
+    index: int
+    timestamp: float
+    image: np.ndarray  # HxWx3 RGB uint8, or HxW for gray
+    yaw_hint: float | None = None  # client-supplied yaw (keyframe bundles)
+    sharpness: float | None = None  # face-region Laplacian score, set by the selector
 
 
 def extract_frames(video_path: str) -> list[str]:
@@ -29,3 +63,198 @@ def extract_frames(video_path: str) -> list[str]:
     )
     print(f"[frame_extractor] Extracted {len(frames)} frames")
     return frames
+
+
+def iter_frames(
+    video_path: str,
+    fps: float = 1.0,
+    pix_fmt: str = "rgb24",
+    max_side: int | None = None,
+    start: float = 0.0,
+    duration: float | None = None,
+    first_index: int = 0,
+    source_size: tuple[int, int] | None = None,
+) -> Iterator[Frame]:
+    """
+    Decode *video_path* (file or URL) at *fps* and yield Frame objects with raw arrays.
+    Audio is dropped; if *max_side* is set the longest edge is downscaled
+    inside the ffmpeg filter graph. *start*/*duration* restrict decoding to
+    a window of the video. *source_size* is the displayed (w, h) when already
+    known from the upload probe, which saves an ffprobe. At most FRAME_BUFFER
+    frames are held ahead of the consumer. Closing the generator early stops
+    ffmpeg.
+    """
+    if pix_fmt not in _CHANNELS:
+        raise ValueError(f"Unsupported pix_fmt '{pix_fmt}'")
+
+    width, height = _output_size(video_path, max_side, source_size)
+    channels = _CHANNELS[pix_fmt]
+    frame_bytes = width * height * channels
+
+    input_kwargs: dict = {}
+    if start > 0:
+        input_kwargs["ss"] = start
+    if duration is not None:
+        input_kwargs["t"] = duration
+    stream = _input(video_path, **input_kwargs).filter("fps", fps=fps)
+    if max_side:
+        stream = stream.filter("scale", width, height)
+    process = (
+        stream
+        .output("pipe:", format="rawvideo", pix_fmt=pix_fmt, an=None)
+        .global_args("-loglevel", "error", "-nostats")
+        .run_async(pipe_stdout=True, pipe_stderr=True)
+    )
+
+    buf: queue.Queue = queue.Queue(maxsize=max(FRAME_BUFFER, 1))
+    stop = threading.Event()
+
+    def _reader():
+        try:
+            while not stop.is_set():
+                raw = process.stdout.read(frame_bytes)
+                if len(raw) < frame_bytes:
+                    break
+                _put(raw)
+        finally:
+            _put(None)
+
+    def _put(item):
+        # Block while the consumer is busy, but give up once it has gone away
+        while not stop.is_set():
+            try:
+                buf.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    reader = threading.Thread(target=_reader, daemon=True)
+    reader.start()
+
+    shape = (height, width, channels) if channels > 1 else (height, width)
+    index = 0
+    finished = False
+    try:
+        while True:
+            raw = buf.get()
+            if raw is None:
+                finished = True
+                break
+            image = np.frombuffer(raw, dtype=np.uint8).reshape(shape)
+            frame = Frame(
+                index=first_index + index,
+                timestamp=start + index / fps,
+                image=image,
+            )
+            index += 1
+            yield frame
+    finally:
+        stop.set()
+        if not finished:
+            process.kill()
+        reader.join(timeout=5)
+        stderr = process.stderr.read()
+        process.stdout.close()
+        process.stderr.close()
+        process.wait()
+        if finished and process.returncode != 0:
+            raise ffmpeg.Error("ffmpeg", None, stderr)
+        print(f"[frame_extractor] Decoded {index} frames ({width}x{height} {pix_fmt})")
+
+
+def decode_frames_at(
+    video_path: str,
+    targets: list[Frame],
+    max_side: int | None = None,
+    source_size: tuple[int, int] | None = None,
+) -> list[Frame]:
+    """
+    Seek to each target's timestamp and decode one full-resolution RGB frame.
+    The returned frames keep the index/timestamp/scores of their targets, so
+    they can stand in for low-res proxies picked during a scoring pass.
+    """
+    width, height = _output_size(video_path, max_side, source_size)
+    frame_bytes = width * height * 3
+
+    frames: list[Frame] = []
+    for target in targets:
+        stream = _input(video_path, ss=target.timestamp)
+        if max_side:
+            stream = stream.filter("scale", width, height)
+        raw, _ = (
+            stream
+            .output("pipe:", format="rawvideo", pix_fmt="rgb24", vframes=1, an=None)
+            .global_args("-loglevel", "error", "-nostats")
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+        if len(raw) < frame_bytes:
+            print(f"[frame_extractor] No frame at t={target.timestamp:.2f}s — skipping")
+            continue
+        image = np.frombuffer(raw[:frame_bytes], dtype=np.uint8).reshape(height, width, 3)
+        frames.append(Frame(
+            index=target.index,
+            timestamp=target.timestamp,
+            image=image,
+            yaw_hint=target.yaw_hint,
+            sharpness=target.sharpness,
+        ))
+
+    print(f"[frame_extractor] Seek-decoded {len(frames)} full-res frames ({width}x{height})")
+    return frames
+
+
+def save_frames(frames: list[Frame], out_dir: str | None = None) -> list[str]:
+    """
+    Write *frames* as PNGs. Returns the file paths in the same order.
+    Caller must clean up the directory.
+    """
+    out_dir = out_dir or tempfile.mkdtemp(prefix="frames_")
+    paths: list[str] = []
+    for frame in frames:
+        path = os.path.join(out_dir, f"frame_{frame.index:04d}.png")
+        img = frame.image
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+        cv2.imwrite(path, img)
+        paths.append(path)
+    return paths
+
+
+def _input(video_path: str, **kwargs):
+    """ffmpeg input node; *video_path* may be a local file or an http(s) URL."""
+    if video_path.startswith(("http://", "https://")):
+        kwargs = {**_HTTP_INPUT_ARGS, **kwargs}
+    return ffmpeg.input(video_path, **kwargs)
+
+
+def _output_size(
+    video_path: str,
+    max_side: int | None,
+    source_size: tuple[int, int] | None = None,
+) -> tuple[int, int]:
+    """Displayed (rotation-corrected) frame size after optional downscale."""
+    if source_size is not None:
+        width, height = source_size
+    else:
+        width, height = _probe_size(video_path)
+
+    if max_side and max(width, height) > max_side:
+        factor = max_side / max(width, height)
+        # Even dimensions keep every pix_fmt / scaler happy
+        width = max(2, int(round(width * factor / 2)) * 2)
+        height = max(2, int(round(height * factor / 2)) * 2)
+    return width, height
+
+
+def _probe_size(video_path: str) -> tuple[int, int]:
+    probe = ffmpeg.probe(video_path)
+    video = next(s for s in probe["streams"] if s.get("codec_type") == "video")
+    width, height = int(video["width"]), int(video["height"])
+
+    # ffmpeg auto-rotates on decode, so portrait phone videos come out swapped
+    rotation = int(video.get("tags", {}).get("rotate", 0))
+    for side_data in video.get("side_data_list", []):
+        rotation = int(side_data.get("rotation", rotation))
+    if abs(rotation) % 180 == 90:
+        width, height = height, width
+    return width, height
@@ -1,105 +1,355 @@
 """
-Select the best frames from a list:
-  1. Score each frame by Laplacian sharpness.
-  2. Estimate yaw angle using MediaPipe FaceMesh.
+Select the best frames from a stream of decoded frames:
+  1. Score each frame by Laplacian sharpness of the face region.
+  2. Estimate yaw angle from MediaPipe FaceMesh landmarks (tracked across
+     frames on a face crop, and kept in a LandmarkCache so face analysis
+     can reuse them).
   3. Cluster frames by yaw into N bins.
   4. Pick the sharpest frame from each bin.
 
-Returns ≤ MAX_FRAMES selected frame paths.
+Frames are consumed one at a time as they are decoded; only the current best
+candidate per bin is kept in memory. Decoding stops early once every bin holds
+a face above MIN_SHARPNESS, and the job fails fast with NoFaceDetectedError
+when no face shows up in the first NO_FACE_TIMEOUT seconds of video.
+Returns ≤ MAX_FRAMES selected frames.
+
+select_frames_two_pass() runs the same selection on a cheap low-res gray
+proxy stream (dropping near-duplicate frames by perceptual hash and sampling
+denser where yaw bins are still empty), then seek-decodes full resolution
+only for the winners. Their proxy landmarks are discarded, so face analysis
+measures the full-resolution frames rather than the 320 px gray proxy.
 """
 from __future__ import annotations
 
-import math
+import os
+from typing import Iterable, Iterator
 
 import cv2
-import mediapipe as mp
 import numpy as np
 
+from pipeline.frame_extractor import Frame, decode_frames_at, iter_frames
+from pipeline.landmark_pool import LandmarkPool, get_landmark_pool
+from pipeline.landmarks import FACE_TRACKING, FaceTracker, LandmarkCache, face_roi, yaw_degrees
+
 MAX_FRAMES = 8
 YAW_BINS = 4  # front, slight-left, slight-right, profile
 
+# Early termination / fast rejection
+MIN_SHARPNESS = float(os.environ.get("MIN_SHARPNESS", "50"))
+NO_FACE_TIMEOUT = float(os.environ.get("NO_FACE_TIMEOUT", "4"))  # seconds of video
 
-def _laplacian_score(path: str) -> float:
-    img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-    if img is None:
-        return 0.0
-    return float(cv2.Laplacian(img, cv2.CV_64F).var())
+# Two-pass proxy stream
+PROXY_FPS = float(os.environ.get("PROXY_FPS", "2"))
+PROXY_MAX_SIDE = int(os.environ.get("PROXY_MAX_SIDE", "320"))
+DENSE_FPS = float(os.environ.get("DENSE_FPS", "6"))
+# Cap on proxy frames for long videos (when the duration is known up front)
+MAX_PROXY_FRAMES = int(os.environ.get("MAX_PROXY_FRAMES", "60"))
+MAX_DENSE_WINDOWS = 4
+DUPLICATE_HAMMING = 5  # dHash bits that may differ for a near-duplicate
 
 
-def _estimate_yaw(path: str, face_mesh) -> float | None:
-    """Return yaw angle in degrees (-90..90) or None if no face detected."""
-    img = cv2.imread(path)
-    if img is None:
-        return None
-    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    result = face_mesh.process(rgb)
-    if not result.multi_face_landmarks:
-        return None
+class NoFaceDetectedError(ValueError):
+    """Raised when the video contains no usable face."""
 
-    lm = result.multi_face_landmarks[0].landmark
-    h, w = img.shape[:2]
 
-    # Nose tip (1), left eye outer (263), right eye outer (33)
-    nose = np.array([lm[1].x * w, lm[1].y * h, lm[1].z * w])
-    left_eye = np.array([lm[263].x * w, lm[263].y * h, lm[263].z * w])
-    right_eye = np.array([lm[33].x * w, lm[33].y * h, lm[33].z * w])
+def _laplacian_score(image: np.ndarray) -> float:
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
 
-    eye_center = (left_eye + right_eye) / 2.0
-    diff = nose - eye_center
-    yaw = math.degrees(math.atan2(diff[0], diff[2]))
-    return yaw
 
+def _dhash(image: np.ndarray) -> np.ndarray:
+    """64-bit difference hash as a boolean array."""
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return (small[:, 1:] > small[:, :-1]).ravel()
 
-def select_frames(frame_paths: list[str]) -> list[str]:
-    if not frame_paths:
-        return []
 
-    mp_face_mesh = mp.solutions.face_mesh
-    face_mesh = mp_face_mesh.FaceMesh(
-        static_image_mode=True,
-        max_num_faces=1,
-        refine_landmarks=False,
-        min_detection_confidence=0.5,
-    )
+def _yaw_bin(yaw: float) -> int:
+    bin_size = 180.0 / YAW_BINS
+    return min(max(int((yaw + 90.0) / bin_size), 0), YAW_BINS - 1)
 
-    scored: list[tuple[str, float, float]] = []
-    for path in frame_paths:
-        sharpness = _laplacian_score(path)
-        yaw = _estimate_yaw(path, face_mesh) or 0.0
-        scored.append((path, sharpness, yaw))
 
-    face_mesh.close()
+class _FrameBins:
+    """
+    Streaming yaw-bin tracker. Only the sharpest frame per bin and the two
+    sharpest overall can end up selected, so those are all it holds on to.
+    """
 
-    # Filter out blurry frames (below 20th percentile)
-    sharpnesses = [s for _, s, _ in scored]
-    threshold = float(np.percentile(sharpnesses, 20)) if sharpnesses else 0.0
-    scored = [(p, s, y) for p, s, y in scored if s >= threshold]
+    def __init__(self):
+        self.sharpnesses: list[float] = []
+        self.trace: list[tuple[float, float | None]] = []  # (timestamp, yaw)
+        self.bins: dict[int, tuple[Frame, float]] = {}
+        self.top: list[tuple[Frame, float]] = []
+        self.first: Frame | None = None
+        self.start: float | None = None
+        self.seen = 0
+        self.next_index = 0
 
-    if not scored:
-        return [frame_paths[0]]
+    def add(self, frame: Frame, sharpness: float, yaw: float | None) -> None:
+        if self.start is None:
+            self.start = frame.timestamp
+        self.seen += 1
+        self.next_index = max(self.next_index, frame.index + 1)
+        self.trace.append((frame.timestamp, yaw))
 
-    # Bin by yaw
-    bin_size = 180.0 / YAW_BINS
-    bins: dict[int, list[tuple[str, float]]] = {i: [] for i in range(YAW_BINS)}
-    for path, sharpness, yaw in scored:
-        bin_idx = min(int((yaw + 90.0) / bin_size), YAW_BINS - 1)
-        bins[bin_idx].append((path, sharpness))
-
-    selected: list[str] = []
-    for bin_frames in bins.values():
-        if not bin_frames:
+        # Frames without a face are useless downstream — don't let them
+        # occupy a bin
+        if yaw is None:
+            if self.first is None and frame.timestamp - self.start >= NO_FACE_TIMEOUT:
+                raise NoFaceDetectedError(
+                    f"No face detected in the first {NO_FACE_TIMEOUT:g}s of video"
+                )
+            return
+
+        frame.sharpness = sharpness
+        if self.first is None:
+            self.first = frame
+        self.sharpnesses.append(sharpness)
+
+        bin_idx = _yaw_bin(yaw)
+        if bin_idx not in self.bins or sharpness > self.bins[bin_idx][1]:
+            self.bins[bin_idx] = (frame, sharpness)
+
+        self.top.append((frame, sharpness))
+        self.top.sort(key=lambda x: -x[1])
+        del self.top[2:]
+
+    def missing_bins(self) -> list[int]:
+        return [i for i in range(YAW_BINS) if i not in self.bins]
+
+    def is_complete(self) -> bool:
+        """Every yaw bin already holds a face sharp enough to keep."""
+        return len(self.bins) == YAW_BINS and all(
+            sharpness >= MIN_SHARPNESS for _, sharpness in self.bins.values()
+        )
+
+    def result(self) -> list[Frame]:
+        if self.first is None:
+            if self.seen:
+                raise NoFaceDetectedError(f"No face detected in {self.seen} frames")
+            return []
+
+        # Filter out blurry frames (below 20th percentile)
+        threshold = float(np.percentile(self.sharpnesses, 20))
+
+        selected: list[Frame] = []
+        for bin_idx in range(YAW_BINS):
+            if bin_idx in self.bins and self.bins[bin_idx][1] >= threshold:
+                selected.append(self.bins[bin_idx][0])
+
+        if not selected:
+            return [self.first]
+
+        # Fallback: if fewer than 2 selected, add top sharpness frames
+        if len(selected) < 2:
+            for frame, sharpness in self.top:
+                if sharpness >= threshold and all(frame is not s for s in selected):
+                    selected.append(frame)
+                if len(selected) >= 2:
+                    break
+
+        print(f"[frame_selector] Selected {len(selected)} frames from {self.seen}")
+        return selected[:MAX_FRAMES]
+
+
+def _add_scored(
+    bins: _FrameBins,
+    landmarks: LandmarkCache,
+    frame: Frame,
+    points: np.ndarray | None,
+    roi: np.ndarray,
+) -> None:
+    h, w = frame.image.shape[:2]
+    landmarks.put(frame.index, points, (w, h))
+    yaw = None
+    if points is not None:
+        # A client-supplied yaw (device head tracking) beats the 2-D estimate
+        yaw = frame.yaw_hint
+        if yaw is None:
+            yaw = float(yaw_degrees(landmarks.pixels([frame.index]))[0])
+    bins.add(frame, _laplacian_score(roi), yaw)
+
+
+def _chunks(frames: Iterable[Frame], size: int) -> Iterator[list[Frame]]:
+    chunk: list[Frame] = []
+    for frame in frames:
+        chunk.append(frame)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _landmark_chunk(pool: LandmarkPool, chunk: list[Frame]) -> list[np.ndarray | None]:
+    """
+    Pool landmarks for *chunk* in frame order. The pool's shared buffer holds
+    one image shape, so mixed sizes (portrait and landscape stills of a
+    keyframe bundle) are dispatched as one batch per shape.
+    """
+    by_shape: dict[tuple, list[int]] = {}
+    for i, frame in enumerate(chunk):
+        by_shape.setdefault(frame.image.shape, []).append(i)
+    results: list[np.ndarray | None] = [None] * len(chunk)
+    for indices in by_shape.values():
+        for i, points in zip(indices, pool.landmark([chunk[i].image for i in indices])):
+            results[i] = points
+    return results
+
+
+def _score_into(
+    bins: _FrameBins,
+    frames: Iterable[Frame],
+    tracker: FaceTracker | None,
+    landmarks: LandmarkCache,
+    pool: LandmarkPool | None = None,
+) -> None:
+    """
+    Score frames as they arrive; stop (and stop the decoder) once complete.
+    With a *pool*, frames are landmarked in parallel batches (static mode,
+    no tracking) and the completeness check runs once per batch.
+    """
+    try:
+        if pool is None:
+            for frame in frames:
+                points, roi = tracker.process(frame.image)
+                _add_scored(bins, landmarks, frame, points, roi)
+                if bins.is_complete():
+                    break
+        else:
+            for chunk in _chunks(frames, pool.batch_size):
+                for frame, points in zip(chunk, _landmark_chunk(pool, chunk)):
+                    _add_scored(bins, landmarks, frame, points, face_roi(frame.image, points))
+                if bins.is_complete():
+                    break
+        if bins.is_complete():
+            print(f"[frame_selector] All yaw bins filled after {bins.seen} frames — stopping early")
+    finally:
+        close = getattr(frames, "close", None)
+        if close is not None:
+            close()
+
+
+def select_frames(
+    frames: Iterable[Frame],
+    landmarks: LandmarkCache | None = None,
+    tracking: bool = FACE_TRACKING,
+) -> list[Frame]:
+    """
+    Select from any ordered frame stream. Pass tracking=False for sparse
+    stills (keyframe bundles), where consecutive frames aren't continuous.
+    """
+    landmarks = landmarks if landmarks is not None else LandmarkCache()
+    pool = get_landmark_pool()
+    tracker = FaceTracker(tracking) if pool is None else None
+    bins = _FrameBins()
+    try:
+        _score_into(bins, frames, tracker, landmarks, pool)
+    finally:
+        if tracker is not None:
+            tracker.close()
+    return bins.result()
+
+
+# ── Two-pass selection ────────────────────────────────────────────────────────
+
+def _drop_duplicates(frames: Iterable[Frame]) -> Iterator[Frame]:
+    """Skip frames whose dHash is within DUPLICATE_HAMMING of the last kept one."""
+    last: np.ndarray | None = None
+    dropped = 0
+    for frame in frames:
+        h = _dhash(frame.image)
+        if last is not None and np.count_nonzero(h != last) <= DUPLICATE_HAMMING:
+            dropped += 1
             continue
-        best = max(bin_frames, key=lambda x: x[1])
-        selected.append(best[0])
-
-    # Fallback: if fewer than 2 selected, add top sharpness frames
-    if len(selected) < 2:
-        extra = sorted(scored, key=lambda x: -x[1])
-        for path, _, _ in extra:
-            if path not in selected:
-                selected.append(path)
-            if len(selected) >= 2:
+        last = h
+        yield frame
+    if dropped:
+        print(f"[frame_selector] Dropped {dropped} near-duplicate proxy frames")
+
+
+def _dense_windows(bins: _FrameBins) -> list[tuple[float, float]]:
+    """
+    Time windows between consecutive proxy samples whose yaws straddle a bin
+    that is still empty — the head swept through it between two samples.
+    """
+    missing = bins.missing_bins()
+    if not missing:
+        return []
+
+    bin_size = 180.0 / YAW_BINS
+    faces = [(t, y) for t, y in bins.trace if y is not None]
+    windows: list[tuple[float, float]] = []
+    for (t0, y0), (t1, y1) in zip(faces, faces[1:]):
+        lo, hi = min(y0, y1), max(y0, y1)
+        for bin_idx in missing:
+            bin_lo = -90.0 + bin_idx * bin_size
+            if lo < bin_lo + bin_size and hi >= bin_lo:
+                windows.append((t0, t1))
+                break
+        if len(windows) >= MAX_DENSE_WINDOWS:
+            break
+    return windows
+
+
+def select_frames_two_pass(
+    video_path: str,
+    max_side: int | None = None,
+    landmarks: LandmarkCache | None = None,
+    source_size: tuple[int, int] | None = None,
+    duration: float | None = None,
+) -> list[Frame]:
+    """
+    Pass 1: score a small gray proxy stream. Pass 2: seek-decode the chosen
+    timestamps at full resolution (downscaled to *max_side*). Landmarks of
+    the winners are dropped from *landmarks*: they were measured on the
+    PROXY_MAX_SIDE gray proxy, so face analysis re-landmarks the full-res
+    frames (at most MAX_FRAMES FaceMesh runs) instead of reusing them.
+    *source_size* / *duration* come from the upload probe when known; a long
+    video gets a sparser proxy so pass 1 stays within MAX_PROXY_FRAMES.
+    """
+    proxy_fps = PROXY_FPS
+    if duration:
+        proxy_fps = min(PROXY_FPS, MAX_PROXY_FRAMES / duration)
+
+    landmarks = landmarks if landmarks is not None else LandmarkCache()
+    pool = get_landmark_pool()
+    tracker = FaceTracker() if pool is None else None
+    bins = _FrameBins()
+    try:
+        proxy = iter_frames(
+            video_path,
+            fps=proxy_fps,
+            pix_fmt="gray",
+            max_side=PROXY_MAX_SIDE,
+            source_size=source_size,
+        )
+        deduped = _drop_duplicates(proxy)
+        try:
+            _score_into(bins, deduped, tracker, landmarks, pool)
+        finally:
+            proxy.close()
+
+        for t0, t1 in _dense_windows(bins):
+            if tracker is not None:
+                tracker.reset()
+            dense = iter_frames(
+                video_path,
+                fps=DENSE_FPS,
+                pix_fmt="gray",
+                max_side=PROXY_MAX_SIDE,
+                start=t0,
+                duration=t1 - t0,
+                first_index=bins.next_index,
+                source_size=source_size,
+            )
+            _score_into(bins, dense, tracker, landmarks, pool)
+            if not bins.missing_bins():
                 break
+    finally:
+        if tracker is not None:
+            tracker.close()
 
-    print(f"[frame_selector] Selected {len(selected)} frames from {len(frame_paths)}")
-    return selected[:MAX_FRAMES]
+    chosen = bins.result()
+    landmarks.discard([frame.index for frame in chosen])
+    return decode_frames_at(video_path, chosen, max_side=max_side, source_size=source_size)
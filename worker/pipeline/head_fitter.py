@@ -1,18 +1,43 @@
 """
 DECA head shape fitter.
 When DECA_ENABLED=false (default for local dev), returns an average-head stub.
-When enabled, runs DECA in a subprocess to avoid PyTorch version conflicts.
+When enabled, DECA runs in a long-lived server process (models/deca_server.py)
+that loads the model once and keeps PyTorch out of the worker env. Frames and
+parameters travel over a unix socket as raw arrays; a crashed server is
+restarted on the next request.
 """
 from __future__ import annotations
 
-import json
 import os
+import socket
 import subprocess
-import tempfile
+import sys
+import threading
+import time
 from dataclasses import dataclass, field
 
+import cv2
 import numpy as np
 
+from models.deca_protocol import recv_message, send_message
+from pipeline.frame_extractor import Frame
+from pipeline.model_registry import registry
+
+DECA_ENABLED = os.environ.get("DECA_ENABLED", "false").lower() == "true"
+# Interpreter of the isolated PyTorch env that runs the server
+DECA_PYTHON = os.environ.get("DECA_PYTHON", sys.executable)
+DECA_SOCKET = os.environ.get("DECA_SOCKET", f"/tmp/deca-{os.getpid()}.sock")
+DECA_STARTUP_TIMEOUT = float(os.environ.get("DECA_STARTUP_TIMEOUT", "300"))
+DECA_REQUEST_TIMEOUT = 120.0
+DECA_INPUT_SIZE = 224
+
+# Model registry name
+DECA_SERVER = "deca_server"
+
+_DECA_SERVER_SCRIPT = os.path.join(
+    os.path.dirname(__file__), "..", "models", "deca_server.py"
+)
+
 
 @dataclass
 class HeadParams:
@@ -24,38 +49,167 @@ class HeadParams:
     centroid: list[float] = field(default_factory=lambda: [0.0, 0.0, 0.0])
 
 
-_DECA_SCRIPT = os.path.join(os.path.dirname(__file__), "..", "models", "run_deca.py")
+class DecaError(RuntimeError):
+    """The DECA server answered a request with an error."""
+
+
+class DecaClient:
+    """Owns the DECA server process and one connection to it."""
+
+    def __init__(self, socket_path: str = DECA_SOCKET):
+        self.socket_path = socket_path
+        self._proc: subprocess.Popen | None = None
+        self._sock: socket.socket | None = None
+        self._lock = threading.Lock()
+        self.restarts = 0
+
+    def start(self) -> None:
+        """Spawn the server and wait until the model is loaded."""
+        with self._lock:
+            self._ensure_running()
+
+    def fit(self, images: np.ndarray) -> dict[str, np.ndarray]:
+        """
+        Encode N×224×224×3 RGB uint8 images. If the server has died (or dies
+        mid-request) it is restarted and the request retried once.
+        """
+        with self._lock:
+            for attempt in range(2):
+                self._ensure_running()
+                try:
+                    header, arrays = self._request({"op": "fit"}, {"images": images})
+                    break
+                except (OSError, ValueError) as exc:
+                    if attempt:
+                        raise
+                    print(f"[head_fitter] DECA server connection lost ({exc}) — restarting")
+                    self._stop()
+                    self.restarts += 1
+        if not header.get("ok"):
+            raise DecaError(header.get("error") or "DECA server error")
+        return arrays
+
+    def close(self) -> None:
+        with self._lock:
+            self._stop()
+
+    # ── Internals (callers hold self._lock) ──────────────────────────────────
+
+    def _request(self, header: dict, arrays: dict | None = None):
+        send_message(self._sock, header, arrays)
+        return recv_message(self._sock)
+
+    def _ensure_running(self) -> None:
+        if self._proc is not None and self._proc.poll() is None and self._sock is not None:
+            return
+        if self._proc is not None:
+            print(f"[head_fitter] DECA server died (code {self._proc.returncode}) — restarting")
+            self.restarts += 1
+        self._stop()
 
+        t0 = time.monotonic()
+        self._proc = subprocess.Popen([
+            DECA_PYTHON, _DECA_SERVER_SCRIPT,
+            "--socket", self.socket_path,
+            "--parent-pid", str(os.getpid()),
+        ])
+        deadline = t0 + DECA_STARTUP_TIMEOUT
+        while True:
+            if self._proc.poll() is not None:
+                raise RuntimeError(f"DECA server exited with code {self._proc.returncode}")
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.socket_path)
+                break
+            except OSError:
+                sock.close()
+                if time.monotonic() > deadline:
+                    self._stop()
+                    raise TimeoutError("DECA server did not come up in time")
+                time.sleep(0.2)
 
-def fit_head(frame_paths: list[str]) -> HeadParams:
+        sock.settimeout(DECA_REQUEST_TIMEOUT)
+        self._sock = sock
+        header, _ = self._request({"op": "ping"})
+        print(
+            f"[head_fitter] DECA server ({header.get('backend')}) up in "
+            f"{time.monotonic() - t0:.1f}s (model load {header.get('load_seconds', 0):.1f}s)"
+        )
+        if not header.get("ok"):
+            print(f"[head_fitter] DECA server unusable: {header.get('error')}")
+
+    def _stop(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self._proc is not None:
+            if self._proc.poll() is None:
+                self._proc.terminate()
+                try:
+                    self._proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    self._proc.kill()
+                    self._proc.wait()
+            self._proc = None
+
+
+registry.register(DECA_SERVER, DecaClient, warmup=lambda client: client.start())
+
+
+def _weighted_median(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Per-column weighted median of N×D *values* with N *weights*."""
+    order = np.argsort(values, axis=0)
+    cum = np.cumsum(weights[order], axis=0)
+    rows = (cum < 0.5 * cum[-1]).sum(axis=0)
+    return np.take_along_axis(values, order, axis=0)[rows, np.arange(values.shape[1])]
+
+
+def _fuse(codes: dict[str, np.ndarray], weights: np.ndarray) -> HeadParams:
+    """
+    One HeadParams from N per-frame codes. Shape, expression, scale and jaw
+    pose are weighted medians (robust to a single bad fit). The global head
+    rotation differs by view on purpose, so it is taken from the most
+    frontal frame rather than averaged.
+    """
+    pose = codes["pose"]
+    frontal = int(np.argmin(np.linalg.norm(pose[:, :3], axis=1)))
+    jaw = _weighted_median(pose[:, 3:], weights)
+    return HeadParams(
+        shape=_weighted_median(codes["shape"], weights).tolist(),
+        pose=pose[frontal, :3].tolist() + jaw.tolist(),
+        expression=_weighted_median(codes["expression"], weights).tolist(),
+        scale=float(_weighted_median(codes["scale"][:, None], weights)[0]),
+    )
+
+
+def fit_head(frames: list[Frame]) -> HeadParams:
     """
-    Fit FLAME head model to the best front-facing frame.
+    Fit the FLAME head model to all selected frames in one batched DECA pass
+    and fuse the per-frame codes, weighted by frame sharpness.
     Falls back to stub when DECA_ENABLED != 'true'.
     """
-    if os.environ.get("DECA_ENABLED", "false").lower() != "true":
+    if not DECA_ENABLED:
         print("[head_fitter] DECA_ENABLED=false — using stub average head")
         return HeadParams()
 
-    # Pick the first available frame
-    img_path = next((p for p in frame_paths if os.path.exists(p)), None)
-    if img_path is None:
+    rgb = [f for f in frames if f.image.ndim == 3]
+    if not rgb:
         return HeadParams()
 
-    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as out_f:
-        out_path = out_f.name
+    # Resize to DECA expected input, stacked N×224×224×3
+    images = np.stack([
+        cv2.resize(f.image, (DECA_INPUT_SIZE, DECA_INPUT_SIZE)) for f in rgb
+    ])
+    weights = np.array([f.sharpness or 0.0 for f in rgb], dtype=np.float64)
+    if weights.sum() <= 0:
+        weights = np.ones(len(rgb))
 
     try:
-        subprocess.run(
-            ["python", _DECA_SCRIPT, "--image", img_path, "--output", out_path],
-            check=True,
-            timeout=120,
-        )
-        with open(out_path) as f:
-            data = json.load(f)
-        return HeadParams(**data)
+        t0 = time.monotonic()
+        with registry.borrow(DECA_SERVER) as deca:
+            codes = deca.fit(images)
+        print(f"[head_fitter] DECA encoded {len(rgb)} frames in {time.monotonic() - t0:.2f}s")
+        return _fuse(codes, weights)
     except Exception as exc:
         print(f"[head_fitter] DECA failed: {exc} — using stub")
         return HeadParams()
-    finally:
-        if os.path.exists(out_path):
-            os.unlink(out_path)
@@ -0,0 +1,150 @@
+"""
+Personalized FLAME head mesh from DECA's HeadParams.
+
+The FLAME blendshape basis is loaded once from an npz (FLAME_BASIS_PATH,
+converted offline from the license-gated FLAME model) with arrays:
+
+  v_template  V×3 float  mean head
+  shapedirs   V×3×K      shape components first, expression from index 300
+  faces       F×3 int
+
+The 100 shape + 50 expression directions are flattened into one
+(V·3)×150 float32 matrix, so a mesh is a single matrix–vector product:
+
+  vertices = v_template + B @ [shape, expression]
+
+Pose (jaw / neck skinning) is not applied. Meshes are cached in an LRU keyed
+by the coefficients quantized to HEAD_MESH_QUANT, so repeat or near-identical
+heads — e.g. every style rendered for one job — skip the rebuild.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+FLAME_BASIS_PATH = os.environ.get("FLAME_BASIS_PATH", "/app/flame/flame_basis.npz")
+HEAD_MESH_CACHE_SIZE = int(os.environ.get("HEAD_MESH_CACHE_SIZE", "32"))
+HEAD_MESH_QUANT = float(os.environ.get("HEAD_MESH_QUANT", "0.05"))
+
+N_SHAPE = 100
+N_EXPRESSION = 50
+EXPRESSION_OFFSET = 300  # FLAME stores 300 shape components before expression
+
+# Radius the renderer's placeholder head sphere uses at scale 1.0
+HEAD_RADIUS = 0.5
+
+
+@dataclass
+class HeadMesh:
+    vertices: np.ndarray  # V×3 float32, centred, scaled to HEAD_RADIUS
+    faces: np.ndarray     # F×3 int32
+
+
+class FlameBasis:
+    """FLAME template + flattened shape/expression blendshapes."""
+
+    def __init__(self, v_template: np.ndarray, shapedirs: np.ndarray, faces: np.ndarray):
+        n_vertices = len(v_template)
+        dirs = np.concatenate(
+            [
+                shapedirs[:, :, :N_SHAPE],
+                shapedirs[:, :, EXPRESSION_OFFSET:EXPRESSION_OFFSET + N_EXPRESSION],
+            ],
+            axis=2,
+        )
+        self.template = np.ascontiguousarray(v_template, dtype=np.float32).reshape(-1)
+        self.basis = np.ascontiguousarray(dirs, dtype=np.float32).reshape(n_vertices * 3, -1)
+        self.faces = np.ascontiguousarray(faces, dtype=np.int32)
+
+        # Normalize to the renderer's head size using the mean head, so
+        # personalized shapes keep their relative size differences
+        centre = v_template.mean(axis=0)
+        self.centre = centre.astype(np.float32)
+        self.unit = np.float32(
+            HEAD_RADIUS / np.linalg.norm(v_template - centre, axis=1).max()
+        )
+
+    @classmethod
+    def load(cls, path: str = FLAME_BASIS_PATH) -> "FlameBasis":
+        with np.load(path) as data:
+            return cls(data["v_template"], data["shapedirs"], data["faces"])
+
+    def vertices(self, coefficients: np.ndarray) -> np.ndarray:
+        """V×3 vertices for 150 [shape, expression] coefficients, normalized."""
+        flat = self.template + self.basis @ coefficients.astype(np.float32)
+        return (flat.reshape(-1, 3) - self.centre) * self.unit
+
+
+_BASIS: FlameBasis | None = None
+_BASIS_LOADED = False
+_LOCK = threading.Lock()
+_CACHE: OrderedDict[bytes, HeadMesh] = OrderedDict()
+_STATS = {"hits": 0, "misses": 0}
+
+
+def get_flame_basis() -> FlameBasis | None:
+    """The worker-wide basis, loaded on first use. None when not installed."""
+    global _BASIS, _BASIS_LOADED
+    with _LOCK:
+        if not _BASIS_LOADED:
+            _BASIS_LOADED = True
+            if os.path.exists(FLAME_BASIS_PATH):
+                try:
+                    _BASIS = FlameBasis.load(FLAME_BASIS_PATH)
+                    print(
+                        f"[head_mesh] Loaded FLAME basis: {len(_BASIS.template) // 3} vertices, "
+                        f"{_BASIS.basis.shape[1]} components"
+                    )
+                except Exception as exc:
+                    print(f"[head_mesh] Failed to load FLAME basis: {exc}")
+            else:
+                print(f"[head_mesh] No FLAME basis at {FLAME_BASIS_PATH} — using sphere head")
+        return _BASIS
+
+
+def _coefficients(shape: list[float], expression: list[float]) -> np.ndarray:
+    coeffs = np.zeros(N_SHAPE + N_EXPRESSION, dtype=np.float32)
+    s = np.asarray(shape[:N_SHAPE], dtype=np.float32)
+    e = np.asarray(expression[:N_EXPRESSION], dtype=np.float32)
+    coeffs[:len(s)] = s
+    coeffs[N_SHAPE:N_SHAPE + len(e)] = e
+    return coeffs
+
+
+def build_head_mesh(
+    shape: list[float],
+    expression: list[float],
+    basis: FlameBasis | None = None,
+) -> HeadMesh | None:
+    """Head mesh for DECA codes, from the LRU cache when possible. None without a basis."""
+    basis = basis or get_flame_basis()
+    if basis is None:
+        return None
+
+    # Build from the quantized coefficients so a cache hit is exactly the
+    # mesh a rebuild would produce
+    steps = np.round(_coefficients(shape, expression) / HEAD_MESH_QUANT).astype(np.int32)
+    key = steps.tobytes()
+    with _LOCK:
+        mesh = _CACHE.get(key)
+        if mesh is not None:
+            _CACHE.move_to_end(key)
+            _STATS["hits"] += 1
+            return mesh
+        _STATS["misses"] += 1
+
+    mesh = HeadMesh(basis.vertices(steps * np.float32(HEAD_MESH_QUANT)), basis.faces)
+    with _LOCK:
+        _CACHE[key] = mesh
+        while len(_CACHE) > HEAD_MESH_CACHE_SIZE:
+            _CACHE.popitem(last=False)
+    return mesh
+
+
+def cache_stats() -> dict[str, int]:
+    with _LOCK:
+        return {**_STATS, "size": len(_CACHE)}
@@ -0,0 +1,133 @@
+"""
+Decode a client-extracted keyframe bundle into in-memory frames.
+
+Instead of a video, the app may upload a small zip of JPEG keyframes with a
+manifest.json:
+
+  {"frames": [{"file": "000.jpg", "timestamp": 0.0, "yaw": -35.0}, ...]}
+
+"timestamp" and "yaw" (degrees, client-estimated) are optional numbers; null
+counts as absent. The frames
+skip download + ffmpeg entirely and go straight to frame selection.
+
+Bundles are capped at MAX_BUNDLE_BYTES compressed and MAX_UNPACKED_BYTES
+decompressed (checked per member before it is read); a malformed bundle or
+manifest raises ValueError.
+"""
+from __future__ import annotations
+
+import io
+import json
+import math
+import zipfile
+
+import cv2
+import numpy as np
+
+from pipeline.frame_extractor import Frame
+
+MAX_KEYFRAMES = 64
+MAX_BUNDLE_BYTES = 16 * 2**20
+MAX_UNPACKED_BYTES = 64 * 2**20  # total decompressed size of what is read
+MANIFEST = "manifest.json"
+
+
+def load_keyframes(data: bytes, max_side: int | None = None) -> list[Frame]:
+    """Parse bundle bytes into RGB Frames, in manifest order."""
+    if len(data) > MAX_BUNDLE_BYTES:
+        raise ValueError(f"Keyframe bundle too large ({len(data)} bytes)")
+
+    try:
+        bundle = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile as exc:
+        raise ValueError(f"Keyframe bundle is not a valid zip: {exc}") from exc
+
+    with bundle:
+        infos = {info.filename: info for info in bundle.infolist()}
+        names = set(infos)
+        budget = _Budget(MAX_UNPACKED_BYTES)
+        if MANIFEST in names:
+            entries = _manifest_entries(budget.read(bundle, infos[MANIFEST]))
+        else:
+            # No manifest — take the JPEGs in name order, without hints
+            entries = [
+                {"file": n} for n in sorted(names)
+                if n.lower().endswith((".jpg", ".jpeg"))
+            ]
+
+        frames: list[Frame] = []
+        for index, entry in enumerate(entries[:MAX_KEYFRAMES]):
+            name = entry.get("file")
+            if not isinstance(name, str) or name not in names:
+                print(f"[keyframe_bundle] Missing {name!r} in bundle — skipping")
+                continue
+            buf = np.frombuffer(budget.read(bundle, infos[name]), dtype=np.uint8)
+            img = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+            if img is None:
+                print(f"[keyframe_bundle] Could not decode {name!r} — skipping")
+                continue
+            img = cv2.cvtColor(_downscale(img, max_side), cv2.COLOR_BGR2RGB)
+            timestamp = _number(entry, "timestamp")
+            frames.append(Frame(
+                index=index,
+                timestamp=timestamp if timestamp is not None else float(index),
+                image=img,
+                yaw_hint=_number(entry, "yaw"),
+            ))
+
+    print(f"[keyframe_bundle] Loaded {len(frames)} keyframes")
+    return frames
+
+
+class _Budget:
+    """Running cap on decompressed bytes, checked before each member is read."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.remaining = limit
+
+    def read(self, bundle: zipfile.ZipFile, info: zipfile.ZipInfo) -> bytes:
+        # file_size is the archive's own claim — cap the actual read too
+        data = b""
+        if info.file_size <= self.remaining:
+            with bundle.open(info) as member:
+                data = member.read(self.remaining + 1)
+        if info.file_size > self.remaining or len(data) > self.remaining:
+            raise ValueError(f"Keyframe bundle unpacks to more than {self.limit} bytes")
+        self.remaining -= len(data)
+        return data
+
+
+def _manifest_entries(raw: bytes) -> list[dict]:
+    try:
+        manifest = json.loads(raw)
+    except ValueError as exc:
+        raise ValueError(f"Keyframe manifest is not valid JSON: {exc}") from exc
+    if not isinstance(manifest, dict):
+        raise ValueError("Keyframe manifest must be a JSON object")
+    entries = manifest.get("frames", [])
+    if not isinstance(entries, list) or not all(isinstance(e, dict) for e in entries):
+        raise ValueError("Keyframe manifest \"frames\" must be a list of objects")
+    return entries
+
+
+def _number(entry: dict, key: str) -> float | None:
+    """Optional finite number *key* of a manifest entry; None when absent or null."""
+    value = entry.get(key)
+    if value is None:
+        return None
+    try:
+        number = float(value) if not isinstance(value, (bool, str)) else None
+    except (TypeError, OverflowError):
+        number = None
+    if number is None or not math.isfinite(number):
+        raise ValueError(f"Keyframe manifest \"{key}\" must be a number, got {value!r}")
+    return number
+
+
+def _downscale(img: np.ndarray, max_side: int | None) -> np.ndarray:
+    h, w = img.shape[:2]
+    if not max_side or max(w, h) <= max_side:
+        return img
+    factor = max_side / max(w, h)
+    return cv2.resize(img, (int(w * factor), int(h * factor)), interpolation=cv2.INTER_AREA)
@@ -0,0 +1,139 @@
+"""
+Parallel FaceMesh landmarking across a process pool.
+
+Frames of a batch are copied once into a multiprocessing.shared_memory block
+laid out as an N×H×W×C uint8 array. Each pool process holds its own preloaded
+static-mode FaceMesh and landmarks a contiguous slice of that array in place,
+so no image is ever pickled. Only the small 468×3 results travel back, and
+they are returned in frame order.
+
+Enabled with LANDMARK_WORKERS > 1.
+"""
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from pipeline.landmarks import FACE_MESH_STATIC, LANDMARK_COUNT, detect_landmarks
+from pipeline.model_registry import registry
+
+LANDMARK_WORKERS = int(os.environ.get("LANDMARK_WORKERS", "1"))
+WARM_UP_TIMEOUT = float(os.environ.get("LANDMARK_WARM_UP_TIMEOUT", "120"))
+
+_worker_mesh = None  # per pool process
+
+
+def _init_worker() -> None:
+    global _worker_mesh
+    # Held for the life of the pool process
+    _worker_mesh = registry.acquire(FACE_MESH_STATIC)
+
+
+def _ping(barrier) -> int:
+    # Held until every pool process has taken a ping, so none can take two
+    barrier.wait()
+    return os.getpid()
+
+
+def _landmark_slice(
+    shm_name: str,
+    shape: tuple[int, ...],
+    start: int,
+    stop: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Landmark frames [start, stop) of the shared array. Returns (points, found)."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        points = np.zeros((stop - start, LANDMARK_COUNT, 3), dtype=np.float32)
+        found = np.zeros(stop - start, dtype=bool)
+        for i in range(start, stop):
+            result = detect_landmarks(frames[i], _worker_mesh)
+            if result is not None:
+                points[i - start] = result
+                found[i - start] = True
+        del frames  # release the buffer view before closing
+        return points, found
+    finally:
+        shm.close()
+
+
+class LandmarkPool:
+    """Process pool of FaceMesh workers; landmarks batches of same-size frames."""
+
+    def __init__(self, workers: int = LANDMARK_WORKERS):
+        self.workers = max(workers, 1)
+        # spawn: children must not inherit a half-initialized MediaPipe graph
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+        )
+
+    @property
+    def batch_size(self) -> int:
+        """Frames worth gathering before a dispatch — two slices per worker."""
+        return self.workers * 2
+
+    def warm_up(self, timeout: float = WARM_UP_TIMEOUT) -> list[int]:
+        """
+        Start every pool process (each loads its FaceMesh) ahead of the first
+        job. One ping per process waits on a shared barrier, so the executor
+        has to start all of them. Returns the processes' pids.
+        """
+        with mp.get_context("spawn").Manager() as manager:
+            barrier = manager.Barrier(self.workers, timeout=timeout)
+            futures = [self._executor.submit(_ping, barrier) for _ in range(self.workers)]
+            pids = [future.result() for future in futures]
+        print(f"[landmark_pool] {len(set(pids))} landmark processes started")
+        return pids
+
+    def landmark(self, images: list[np.ndarray]) -> list[np.ndarray | None]:
+        """Landmarks for each image (same shape) in order; None where no face."""
+        if not images:
+            return []
+
+        shape = (len(images),) + images[0].shape
+        shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+        try:
+            frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+            for i, image in enumerate(images):
+                frames[i] = image
+            del frames
+
+            step = -(-len(images) // self.workers)
+            futures = [
+                self._executor.submit(
+                    _landmark_slice, shm.name, shape, start, min(start + step, len(images))
+                )
+                for start in range(0, len(images), step)
+            ]
+
+            results: list[np.ndarray | None] = []
+            for future in futures:
+                points, found = future.result()
+                results.extend(p if f else None for p, f in zip(points, found))
+            return results
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+_POOL: LandmarkPool | None = None
+
+
+def get_landmark_pool() -> LandmarkPool | None:
+    """Worker-wide pool, created on first use. None when parallelism is off."""
+    global _POOL
+    if LANDMARK_WORKERS <= 1:
+        return None
+    if _POOL is None:
+        _POOL = LandmarkPool(LANDMARK_WORKERS)
+    return _POOL
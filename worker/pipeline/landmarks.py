@@ -0,0 +1,275 @@
+"""
+FaceMesh landmark service shared by frame selection and face analysis.
+
+FaceMesh runs at most once per frame. Results are kept in a LandmarkCache as
+one compact N×468×3 float32 array (normalized x, y, z) keyed by frame index,
+and yaw / face ratios are derived from it with vectorized NumPy.
+
+FaceTracker follows the face across ordered frames with a video-mode FaceMesh,
+landmarking only a crop window around the face and falling back to full-frame
+detection when tracking is lost.
+"""
+from __future__ import annotations
+
+import os
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from pipeline.model_registry import registry
+
+LANDMARK_COUNT = 468
+
+# Landmark indices for key measurements
+NOSE_TIP = 1
+LEFT_EYE_OUTER = 263
+RIGHT_EYE_OUTER = 33
+FOREHEAD_TOP = 10
+CHIN_BOTTOM = 152
+LEFT_CHEEK = 234
+RIGHT_CHEEK = 454
+JAW_LEFT = 172
+JAW_RIGHT = 397
+
+FACE_TRACKING = os.environ.get("FACE_TRACKING", "true").lower() == "true"
+TRACK_MARGIN = 0.5  # crop window = face box grown by this fraction of its size per side
+
+
+# Model registry names
+FACE_MESH_STATIC = "face_mesh_static"
+FACE_MESH_VIDEO = "face_mesh_video"
+
+
+def new_face_mesh(static_image_mode: bool = True):
+    return mp.solutions.face_mesh.FaceMesh(
+        static_image_mode=static_image_mode,
+        max_num_faces=1,
+        refine_landmarks=False,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5,
+    )
+
+
+def _warm_face_mesh(face_mesh) -> None:
+    face_mesh.process(np.zeros((192, 192, 3), dtype=np.uint8))
+
+
+registry.register(FACE_MESH_STATIC, lambda: new_face_mesh(True), warmup=_warm_face_mesh)
+registry.register(
+    FACE_MESH_VIDEO,
+    lambda: new_face_mesh(False),
+    warmup=_warm_face_mesh,
+    # Drop tracking state from the previous job
+    reset=lambda face_mesh: face_mesh.reset(),
+)
+
+
+def detect_landmarks(image: np.ndarray, face_mesh) -> np.ndarray | None:
+    """Run FaceMesh on an RGB or gray frame. Returns 468×3 normalized points or None."""
+    rgb = image if image.ndim == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    result = face_mesh.process(np.ascontiguousarray(rgb))
+    if not result.multi_face_landmarks:
+        return None
+    lm = result.multi_face_landmarks[0].landmark
+    return np.array(
+        [(p.x, p.y, p.z) for p in lm[:LANDMARK_COUNT]], dtype=np.float32
+    )
+
+
+def face_box(
+    points: np.ndarray,
+    size: tuple[int, int],
+    margin: float = 0.0,
+) -> tuple[int, int, int, int]:
+    """Pixel bounding box (x0, y0, x1, y1) of normalized *points*, grown by *margin*."""
+    w, h = size
+    x0, y0 = points[:, 0].min() * w, points[:, 1].min() * h
+    x1, y1 = points[:, 0].max() * w, points[:, 1].max() * h
+    mx, my = (x1 - x0) * margin, (y1 - y0) * margin
+    return (
+        max(int(x0 - mx), 0),
+        max(int(y0 - my), 0),
+        min(int(np.ceil(x1 + mx)), w),
+        min(int(np.ceil(y1 + my)), h),
+    )
+
+
+def face_roi(image: np.ndarray, points: np.ndarray | None) -> np.ndarray:
+    """The face region of *image*, or the whole image if there is no usable face."""
+    if points is None:
+        return image
+    h, w = image.shape[:2]
+    x0, y0, x1, y1 = face_box(points, (w, h))
+    if x1 - x0 < 8 or y1 - y0 < 8:
+        return image
+    return image[y0:y1, x0:x1]
+
+
+class FaceTracker:
+    """
+    Landmarks one face across consecutive frames. With tracking on, a
+    video-mode FaceMesh runs on a crop window around the face; the window
+    stays fixed while the face remains well inside it, so the tracker sees a
+    stable image. Whenever the window moves or is dropped, the video mesh's
+    tracking state is reset, since it refers to the old crop's coordinates.
+    When the face is lost, or with tracking off, a static-mode FaceMesh runs
+    full detection on the whole frame.
+    """
+
+    def __init__(self, tracking: bool = FACE_TRACKING):
+        self.tracking = tracking
+        self.static_mesh = registry.acquire(FACE_MESH_STATIC)
+        self.video_mesh = registry.acquire(FACE_MESH_VIDEO) if tracking else None
+        self.window: tuple[int, int, int, int] | None = None
+        self.redetections = 0
+
+    def reset(self) -> None:
+        """Forget the crop window, e.g. after a jump in time."""
+        self._set_window(None)
+
+    def _set_window(self, window: tuple[int, int, int, int] | None) -> None:
+        if window != self.window and self.video_mesh is not None:
+            self.video_mesh.reset()
+        self.window = window
+
+    def process(self, image: np.ndarray) -> tuple[np.ndarray | None, np.ndarray]:
+        """
+        Returns (468×3 landmarks normalized to the full frame or None, face ROI).
+        The ROI is the current face region, for sharpness scoring; it is the
+        whole frame when no face is found.
+        """
+        h, w = image.shape[:2]
+        points = None
+        if self.window is not None:
+            x0, y0, x1, y1 = self.window
+            points = detect_landmarks(image[y0:y1, x0:x1], self.video_mesh)
+            if points is not None:
+                scale = np.array([(x1 - x0) / w, (y1 - y0) / h, (x1 - x0) / w], dtype=np.float32)
+                offset = np.array([x0 / w, y0 / h, 0.0], dtype=np.float32)
+                points = points * scale + offset
+            else:
+                self.redetections += 1
+                self._set_window(None)
+
+        if points is None:
+            points = detect_landmarks(image, self.static_mesh)
+        if points is None:
+            return None, image
+
+        box = face_box(points, (w, h))
+        if box[2] - box[0] < 8 or box[3] - box[1] < 8:
+            # Degenerate box — nothing sensible to crop to
+            self._set_window(None)
+        elif self.tracking and not _well_inside(box, self.window):
+            self._set_window(face_box(points, (w, h), TRACK_MARGIN))
+        return points, face_roi(image, points)
+
+    def close(self) -> None:
+        if self.redetections:
+            print(f"[landmarks] Face tracking lost {self.redetections} times")
+        registry.release(FACE_MESH_STATIC, self.static_mesh)
+        if self.video_mesh is not None:
+            registry.release(FACE_MESH_VIDEO, self.video_mesh)
+
+
+def _well_inside(
+    box: tuple[int, int, int, int],
+    window: tuple[int, int, int, int] | None,
+) -> bool:
+    """Whether *box* keeps at least a tenth of its size clear of *window*'s edges."""
+    if window is None:
+        return False
+    pad_x = (box[2] - box[0]) * 0.1
+    pad_y = (box[3] - box[1]) * 0.1
+    return (
+        box[0] - pad_x >= window[0]
+        and box[1] - pad_y >= window[1]
+        and box[2] + pad_x <= window[2]
+        and box[3] + pad_y <= window[3]
+    )
+
+
+class LandmarkCache:
+    """FaceMesh results for one job, keyed by frame index."""
+
+    def __init__(self, capacity: int = 32):
+        self._points = np.zeros((capacity, LANDMARK_COUNT, 3), dtype=np.float32)
+        self._sizes = np.zeros((capacity, 2), dtype=np.float32)  # (w, h) per row
+        self._rows: dict[int, int] = {}
+        self._next_row = 0  # rows of discarded frames are not reused
+        self._no_face: set[int] = set()
+
+    def __contains__(self, index: int) -> bool:
+        return index in self._rows or index in self._no_face
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def put(self, index: int, points: np.ndarray | None, size: tuple[int, int]) -> None:
+        """Store landmarks for a frame of *size* (w, h); None records "no face"."""
+        if points is None:
+            self._no_face.add(index)
+            return
+        self._no_face.discard(index)
+        row = self._rows.get(index)
+        if row is None:
+            row = self._next_row
+            self._next_row += 1
+            if row == len(self._points):
+                self._grow()
+            self._rows[index] = row
+        self._points[row] = points
+        self._sizes[row] = size
+
+    def discard(self, indices: list[int]) -> None:
+        """Forget these frames, so the next lookup landmarks them again."""
+        for index in indices:
+            self._rows.pop(index, None)
+            self._no_face.discard(index)
+
+    def has_face(self, index: int) -> bool:
+        return index in self._rows
+
+    def pixels(self, indices: list[int]) -> np.ndarray:
+        """N×468×3 landmarks in pixel units (x·w, y·h, z·w) of their source frame."""
+        rows = [self._rows[i] for i in indices]
+        sizes = self._sizes[rows]
+        scale = np.stack([sizes[:, 0], sizes[:, 1], sizes[:, 0]], axis=1)
+        return self._points[rows] * scale[:, None, :]
+
+    def _grow(self) -> None:
+        n = len(self._points)
+        self._points = np.concatenate([self._points, np.zeros_like(self._points)])
+        self._sizes = np.concatenate([self._sizes, np.zeros((n, 2), dtype=np.float32)])
+
+
+def landmark_frame(cache: LandmarkCache, index: int, image: np.ndarray, face_mesh) -> bool:
+    """Landmark *image* unless the cache already has it. Returns whether a face was found."""
+    if index not in cache:
+        h, w = image.shape[:2]
+        cache.put(index, detect_landmarks(image, face_mesh), (w, h))
+    return cache.has_face(index)
+
+
+# ── Vectorized measurements over (..., 468, 3) pixel-space arrays ─────────────
+
+def yaw_degrees(points: np.ndarray) -> np.ndarray:
+    """Head yaw in degrees from nose tip vs. the outer eye corners."""
+    eye_center = (points[..., LEFT_EYE_OUTER, :] + points[..., RIGHT_EYE_OUTER, :]) / 2.0
+    diff = points[..., NOSE_TIP, :] - eye_center
+    return np.degrees(np.arctan2(diff[..., 0], diff[..., 2]))
+
+
+def face_dimensions(points: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(face height, face width, jaw width) in pixels, ignoring depth."""
+    xy = points[..., :2]
+
+    def dist(a: int, b: int) -> np.ndarray:
+        return np.linalg.norm(xy[..., a, :] - xy[..., b, :], axis=-1)
+
+    return (
+        dist(FOREHEAD_TOP, CHIN_BOTTOM),
+        dist(LEFT_CHEEK, RIGHT_CHEEK),
+        dist(JAW_LEFT, JAW_RIGHT),
+    )
@@ -0,0 +1,425 @@
+"""
+Worker-local cache of catalog hair meshes (HairstyleCatalog.mesh_s3_key).
+
+Each asset is fetched from the model-cache bucket once per node, parsed with
+trimesh and converted to plain .npy arrays (vertices float32, faces int32,
+RGBA colours uint8) under MESH_CACHE_DIR/{sha1(key)}/, which later loads
+memory-map without parsing anything. Next to full resolution, vertex-
+clustering LODs are precomputed with cells of MESH_LOD_PIXELS pixels of a
+VIEW_SIZE render; for_size() picks the coarsest LOD whose cells are no
+larger than a pixel at the requested output size and head scale, so the
+decimation error stays below a pixel. Views are rendered at VIEW_SIZE and
+thumbnails are downscaled from them, so by default only the 1 px level is
+built; coarser levels (e.g. MESH_LOD_PIXELS=1,2,4) only get used for
+renders below VIEW_SIZE or heads scaled down to 1/2 or less. Converted
+assets record the LOD cells they were built with and are rebuilt when
+that configuration changes.
+
+Assets are expected in the head frame of the renderer (unit head of radius
+~0.5 at the origin); the renderer applies head_scale.
+
+  memory — LRU of loaded (memory-mapped) assets within MESH_CACHE_MEMORY_MB
+  disk   — converted assets, LRU by mtime within MESH_CACHE_DISK_MB
+
+Fetch, conversion and load times are recorded per asset and summarized by
+report(). A key that fails to fetch or parse is remembered for
+MESH_FAILURE_TTL seconds, so a missing or corrupt mesh is not refetched on
+every render of its style.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+
+import boto3
+import numpy as np
+from botocore.config import Config
+
+MESH_ASSETS_BUCKET = os.environ.get("MESH_ASSETS_BUCKET", "hairstyle-model-cache")
+MESH_CACHE_DIR = os.environ.get("MESH_CACHE_DIR", "/tmp/mesh_cache")
+MESH_CACHE_MEMORY_MB = int(os.environ.get("MESH_CACHE_MEMORY_MB", "256"))
+MESH_CACHE_DISK_MB = int(os.environ.get("MESH_CACHE_DISK_MB", "1024"))
+# LOD cell sizes, in pixels of a VIEW_SIZE render
+MESH_LOD_PIXELS = sorted(
+    float(p) for p in os.environ.get("MESH_LOD_PIXELS", "1").split(",") if p.strip()
+)
+
+# The renderer's camera sits 2 units from the head with a 60° field of view,
+# so a view spans this many mesh units across at the head
+VIEW_EXTENT = 2 * 2.0 * np.tan(np.pi / 6)
+# Seconds a mesh that failed to fetch or parse is not retried
+MESH_FAILURE_TTL = float(os.environ.get("MESH_FAILURE_TTL", "300"))
+LOD_MIN_REDUCTION = 0.9  # keep a LOD only if it drops at least 10% of the faces
+DEFAULT_COLOR = (40, 30, 20, 200)  # matches the placeholder sphere hair
+
+_META = "meta.json"
+_ARRAYS = ("vertices", "faces", "colors")
+
+
+@dataclass
+class MeshLOD:
+    cell: float           # clustering cell in mesh units; 0 for full resolution
+    vertices: np.ndarray  # V×3 float32
+    faces: np.ndarray     # F×3 int32
+    colors: np.ndarray    # V×4 uint8 RGBA
+
+    @property
+    def nbytes(self) -> int:
+        return self.vertices.nbytes + self.faces.nbytes + self.colors.nbytes
+
+
+@dataclass
+class MeshAsset:
+    key: str
+    lods: list[MeshLOD]  # full resolution first, then coarser
+
+    @property
+    def nbytes(self) -> int:
+        return sum(lod.nbytes for lod in self.lods)
+
+    def for_size(self, size: int, scale: float = 1.0) -> MeshLOD:
+        """Coarsest LOD whose cells are no larger than a pixel at *size* px."""
+        pixel = VIEW_EXTENT / size / max(scale, 1e-6)
+        chosen = self.lods[0]
+        for lod in self.lods[1:]:
+            if lod.cell <= pixel * (1 + 1e-6):
+                chosen = lod
+        return chosen
+
+
+# ── Conversion ────────────────────────────────────────────────────────────────
+
+def cluster_vertices(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    colors: np.ndarray,
+    cell: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vertex-clustering decimation: vertices sharing a *cell*-sized grid cell
+    merge into their mean; faces that collapse or duplicate are dropped.
+    """
+    grid = np.floor((vertices - vertices.min(axis=0)) / cell).astype(np.int64)
+    _, cluster, counts = np.unique(grid, axis=0, return_inverse=True, return_counts=True)
+    cluster = cluster.ravel()
+    n = len(counts)
+
+    merged = np.stack(
+        [np.bincount(cluster, weights=vertices[:, i], minlength=n) for i in range(3)], axis=1
+    ) / counts[:, None]
+    merged_colors = np.stack(
+        [np.bincount(cluster, weights=colors[:, i], minlength=n) for i in range(4)], axis=1
+    ) / counts[:, None]
+
+    new_faces = cluster[faces]
+    keep = (
+        (new_faces[:, 0] != new_faces[:, 1])
+        & (new_faces[:, 1] != new_faces[:, 2])
+        & (new_faces[:, 0] != new_faces[:, 2])
+    )
+    new_faces = new_faces[keep]
+    _, first = np.unique(np.sort(new_faces, axis=1), axis=0, return_index=True)
+    new_faces = new_faces[np.sort(first)]
+
+    # Drop clusters no face refers to any more
+    used = np.unique(new_faces)
+    remap = np.full(n, -1, dtype=np.int64)
+    remap[used] = np.arange(len(used))
+    return (
+        merged[used].astype(np.float32),
+        remap[new_faces].astype(np.int32),
+        np.round(merged_colors[used]).astype(np.uint8),
+    )
+
+
+def lod_cells() -> list[float]:
+    """Configured LOD cell sizes in mesh units, finest first."""
+    from pipeline.renderer import VIEW_SIZE  # the renderer imports this module
+
+    return [VIEW_EXTENT / VIEW_SIZE * pixels for pixels in MESH_LOD_PIXELS]
+
+
+def build_lods(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    colors: np.ndarray,
+) -> list[tuple[float, np.ndarray, np.ndarray, np.ndarray]]:
+    """(cell, vertices, faces, colors) for full resolution and each useful LOD."""
+    lods = [(0.0, vertices, faces, colors)]
+    for cell in lod_cells():
+        v, f, c = cluster_vertices(vertices, faces, colors, cell)
+        if len(f) and len(f) <= len(lods[-1][2]) * LOD_MIN_REDUCTION:
+            lods.append((cell, v, f, c))
+    return lods
+
+
+def _parse(body: bytes, key: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    import trimesh
+
+    file_type = os.path.splitext(key)[1].lstrip(".").lower() or "glb"
+    mesh = trimesh.load(io.BytesIO(body), file_type=file_type, force="mesh", process=False)
+    vertices = np.asarray(mesh.vertices, dtype=np.float32)
+    if mesh.visual.kind == "vertex":
+        colors = np.asarray(mesh.visual.vertex_colors, dtype=np.uint8)
+    else:
+        colors = np.tile(np.array(DEFAULT_COLOR, dtype=np.uint8), (len(vertices), 1))
+    return vertices, np.asarray(mesh.faces, dtype=np.int32), colors
+
+
+# ── Cache ─────────────────────────────────────────────────────────────────────
+
+def _s3_client():
+    return boto3.client(
+        "s3",
+        endpoint_url=os.environ.get("MINIO_ENDPOINT", "http://minio:9000"),
+        aws_access_key_id=os.environ.get("MINIO_ACCESS_KEY", "minioadmin"),
+        aws_secret_access_key=os.environ.get("MINIO_SECRET_KEY", "minioadmin"),
+        region_name="us-east-1",
+        config=Config(signature_version="s3v4"),
+    )
+
+
+def _dir_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+    )
+
+
+class MeshAssetCache:
+    def __init__(
+        self,
+        cache_dir: str = MESH_CACHE_DIR,
+        memory_bytes: int = MESH_CACHE_MEMORY_MB * 2**20,
+        disk_bytes: int = MESH_CACHE_DISK_MB * 2**20,
+    ):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: OrderedDict[str, MeshAsset] = OrderedDict()
+        self._memory_used = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()  # digest → bytes, LRU order
+        self._disk_used = 0
+        self._lock = threading.Lock()
+        self._key_locks: dict[str, threading.Lock] = {}  # only while a fetch runs
+        self._failed: dict[str, float] = {}  # key → monotonic time to retry after
+        self.stats = Counter()
+        self.timings: dict[str, float] = Counter()
+        self._scan_disk()
+
+    def get(self, key: str) -> MeshAsset | None:
+        """
+        The asset for *key*, or None if it cannot be fetched or parsed. A
+        failed key is not retried for MESH_FAILURE_TTL seconds.
+        """
+        with self._lock:
+            asset = self._memory.get(key)
+            if asset is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return asset
+            if self._failed_recently(key):
+                self.stats["failure_hits"] += 1
+                return None
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # One fetch per key, however many render threads want it
+        try:
+            with key_lock:
+                with self._lock:
+                    asset = self._memory.get(key)
+                    if asset is not None:
+                        self.stats["memory_hits"] += 1
+                        return asset
+                    if self._failed_recently(key):
+                        self.stats["failure_hits"] += 1
+                        return None
+                asset = self._fetch(key)
+                with self._lock:
+                    if asset is None:
+                        now = time.monotonic()
+                        self._failed = {k: t for k, t in self._failed.items() if t > now}
+                        self._failed[key] = now + MESH_FAILURE_TTL
+                    else:
+                        self._put_memory(key, asset)
+                return asset
+        finally:
+            with self._lock:
+                # Threads already holding this lock object still serialize on it
+                if self._key_locks.get(key) is key_lock and not key_lock.locked():
+                    del self._key_locks[key]
+
+    def _failed_recently(self, key: str) -> bool:
+        retry_at = self._failed.get(key)
+        if retry_at is None:
+            return False
+        if time.monotonic() < retry_at:
+            return True
+        del self._failed[key]
+        return False
+
+    def _fetch(self, key: str) -> MeshAsset | None:
+        """Load *key* from disk, converting it from S3 first if needed."""
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        asset = self._load(key, digest)
+        if asset is not None:
+            with self._lock:
+                self.stats["disk_hits"] += 1
+            return asset
+        try:
+            self._convert(key, digest)
+        except Exception as exc:
+            print(f"[mesh_assets] Could not fetch mesh {key}: {exc}")
+            with self._lock:
+                self.stats["failures"] += 1
+            return None
+        return self._load(key, digest)
+
+    # ── Fetch + convert ───────────────────────────────────────────────────────
+
+    def _fetch_s3(self, key: str) -> bytes:
+        return _s3_client().get_object(Bucket=MESH_ASSETS_BUCKET, Key=key)["Body"].read()
+
+    def _convert(self, key: str, digest: str) -> None:
+        t0 = time.perf_counter()
+        body = self._fetch_s3(key)
+        t1 = time.perf_counter()
+        lods = build_lods(*_parse(body, key))
+        t2 = time.perf_counter()
+
+        final = os.path.join(self.cache_dir, digest)
+        # Unique per process and thread: worker processes share MESH_CACHE_DIR
+        tmp = f"{final}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        meta = {"key": key, "source_bytes": len(body), "lod_cells": lod_cells(), "lods": []}
+        for i, (cell, vertices, faces, colors) in enumerate(lods):
+            for name, array in zip(_ARRAYS, (vertices, faces, colors)):
+                np.save(os.path.join(tmp, f"lod{i}_{name}.npy"), array)
+            meta["lods"].append({"cell": cell, "faces": int(len(faces))})
+        with open(os.path.join(tmp, _META), "w") as f:
+            json.dump(meta, f)
+        shutil.rmtree(final, ignore_errors=True)
+        try:
+            os.replace(tmp, final)
+        except OSError:
+            # Another process installed its conversion first; _load checks it
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        size = _dir_size(final)
+        with self._lock:
+            self.stats["fetches"] += 1
+            self.stats["fetched_bytes"] += len(body)
+            self.timings["fetch_seconds"] += t1 - t0
+            self.timings["convert_seconds"] += t2 - t1
+            self._disk_used += size - self._disk.pop(digest, 0)
+            self._disk[digest] = size
+            victims = self._evict_disk()
+        for victim in victims:
+            shutil.rmtree(os.path.join(self.cache_dir, victim), ignore_errors=True)
+        faces = " → ".join(str(lod["faces"]) for lod in meta["lods"])
+        print(
+            f"[mesh_assets] Converted {key} ({len(body) / 2**20:.1f} MiB) in "
+            f"{t2 - t0:.2f}s — faces per LOD: {faces}"
+        )
+
+    # ── Load (memory-mapped) ──────────────────────────────────────────────────
+
+    def _load(self, key: str, digest: str) -> MeshAsset | None:
+        path = os.path.join(self.cache_dir, digest)
+        t0 = time.perf_counter()
+        try:
+            with open(os.path.join(path, _META)) as f:
+                meta = json.load(f)
+            # Converted for another key (digest collision) or LOD configuration
+            if meta.get("key") != key or meta.get("lod_cells") != lod_cells():
+                return None
+            lods = [
+                MeshLOD(entry["cell"], *(
+                    np.load(os.path.join(path, f"lod{i}_{name}.npy"), mmap_mode="r")
+                    for name in _ARRAYS
+                ))
+                for i, entry in enumerate(meta["lods"])
+            ]
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        with self._lock:
+            self.stats["loads"] += 1
+            self.timings["load_seconds"] += time.perf_counter() - t0
+            if digest in self._disk:
+                self._disk.move_to_end(digest)
+        return MeshAsset(key, lods)
+
+    # ── LRU bookkeeping ───────────────────────────────────────────────────────
+
+    def _put_memory(self, key: str, asset: MeshAsset) -> None:
+        if key in self._memory:
+            self._memory_used -= self._memory.pop(key).nbytes
+        self._memory[key] = asset
+        self._memory_used += asset.nbytes
+        while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= evicted.nbytes
+            self.stats["memory_evictions"] += 1
+
+    def _evict_disk(self) -> list[str]:
+        victims = []
+        while self._disk_used > self.disk_bytes and len(self._disk) > 1:
+            victim, size = self._disk.popitem(last=False)
+            self._disk_used -= size
+            victims.append(victim)
+            self.stats["disk_evictions"] += 1
+        return victims
+
+    def _scan_disk(self) -> None:
+        """Index assets converted by a previous worker, oldest first."""
+        try:
+            names = [n for n in os.listdir(self.cache_dir) if ".tmp" not in n]
+        except OSError:
+            names = []
+        entries = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                entries.append((os.stat(path).st_mtime, name, _dir_size(path)))
+            except OSError:
+                continue
+        for _, digest, size in sorted(entries):
+            self._disk[digest] = size
+            self._disk_used += size
+        if entries:
+            print(f"[mesh_assets] {len(entries)} converted meshes on disk ({self._disk_used / 2**20:.0f} MiB)")
+
+    def report(self) -> dict:
+        with self._lock:
+            stats = {**self.stats, **{k: round(v, 3) for k, v in self.timings.items()}}
+            stats["load_seconds_avg"] = (
+                round(self.timings["load_seconds"] / self.stats["loads"], 4) if self.stats["loads"] else 0.0
+            )
+            return {
+                **stats,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_used,
+            }
+
+
+_CACHE: MeshAssetCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_mesh_assets() -> MeshAssetCache:
+    """Worker-wide cache, created on first use."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = MeshAssetCache()
+        return _CACHE
@@ -0,0 +1,124 @@
+"""
+Worker-level registry of long-lived model instances (MediaPipe graphs).
+
+Models are registered with a factory, an optional warm-up inference and an
+optional reset hook. warm_up() builds one instance of each at worker start so
+the first job does not pay graph setup and model load; stages then borrow
+instances and hand them back instead of building and closing their own.
+Load time and resident-memory growth are recorded per model.
+"""
+from __future__ import annotations
+
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+
+@dataclass
+class _ModelSpec:
+    factory: Callable[[], Any]
+    warmup: Callable[[Any], None] | None = None
+    reset: Callable[[Any], None] | None = None
+    idle: list[Any] = field(default_factory=list)
+    created: int = 0
+    borrowed: int = 0
+    load_seconds: float = 0.0
+    rss_bytes: int = 0
+
+
+def _rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._specs: dict[str, _ModelSpec] = {}
+        self._lock = threading.Lock()
+
+    def register(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        warmup: Callable[[Any], None] | None = None,
+        reset: Callable[[Any], None] | None = None,
+    ) -> None:
+        with self._lock:
+            if name not in self._specs:
+                self._specs[name] = _ModelSpec(factory, warmup, reset)
+
+    def _create(self, name: str) -> Any:
+        spec = self._specs[name]
+        rss_before = _rss_bytes()
+        t0 = time.monotonic()
+        model = spec.factory()
+        if spec.warmup is not None:
+            spec.warmup(model)
+        spec.load_seconds += time.monotonic() - t0
+        spec.rss_bytes += max(_rss_bytes() - rss_before, 0)
+        spec.created += 1
+        return model
+
+    def warm_up(self, names: list[str] | None = None) -> None:
+        """Make sure one warmed-up instance of each model is idle and ready."""
+        for name in names or list(self._specs):
+            with self._lock:
+                if self._specs[name].idle:
+                    continue
+            model = self._create(name)
+            with self._lock:
+                self._specs[name].idle.append(model)
+        for name, stats in self.report().items():
+            print(
+                f"[model_registry] {name}: loaded in {stats['load_seconds']:.2f}s, "
+                f"+{stats['rss_bytes'] / 2**20:.1f} MiB RSS"
+            )
+
+    def acquire(self, name: str) -> Any:
+        """Take an idle instance (or build one if all are lent out)."""
+        with self._lock:
+            spec = self._specs[name]
+            spec.borrowed += 1
+            if spec.idle:
+                return spec.idle.pop()
+        return self._create(name)
+
+    def release(self, name: str, model: Any) -> None:
+        """Hand *model* back, reset to a clean state for the next borrower."""
+        spec = self._specs[name]
+        if spec.reset is not None:
+            spec.reset(model)
+        with self._lock:
+            spec.idle.append(model)
+
+    @contextmanager
+    def borrow(self, name: str) -> Iterator[Any]:
+        model = self.acquire(name)
+        try:
+            yield model
+        finally:
+            self.release(name, model)
+
+    def report(self) -> dict[str, dict]:
+        with self._lock:
+            return {
+                name: {
+                    "instances": spec.created,
+                    "idle": len(spec.idle),
+                    "borrowed": spec.borrowed,
+                    "load_seconds": round(spec.load_seconds, 3),
+                    "rss_bytes": spec.rss_bytes,
+                }
+                for name, spec in self._specs.items()
+            }
+
+
+registry = ModelRegistry()
@@ -0,0 +1,99 @@
+"""
+BlurHash placeholders for result views.
+
+Each view gets a ~30-character BlurHash string that is stored in results_json,
+so a client can paint a blurred preview from the results response alone,
+before any image has downloaded.
+
+blurhash_images() encodes a whole batch of views at once: the views are
+box-downsampled to about SAMPLE_SIDE px and converted to linear RGB as one
+N×h×w×3 stack, and the DCT components of every view come out of a single
+einsum against the cosine bases.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+
+import numpy as np
+
+COMPONENTS_X = 4
+COMPONENTS_Y = 4
+SAMPLE_SIDE = 32  # BlurHash only keeps a few components — a coarse sample is plenty
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _base83(value: int, length: int) -> str:
+    return "".join(_BASE83[(value // 83 ** (length - i - 1)) % 83] for i in range(length))
+
+
+def _srgb_to_linear(values: np.ndarray) -> np.ndarray:
+    v = values / 255.0
+    return np.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(values: np.ndarray) -> np.ndarray:
+    v = np.clip(values, 0.0, 1.0)
+    srgb = np.where(v <= 0.0031308, v * 12.92, 1.055 * v ** (1 / 2.4) - 0.055)
+    return (srgb * 255 + 0.5).astype(np.int64)
+
+
+def _downsample(stack: np.ndarray) -> np.ndarray:
+    """Box-average an N×H×W×3 uint8 stack down to roughly SAMPLE_SIDE, as linear RGB."""
+    _, h, w, _ = stack.shape
+    f = max(min(h, w) // SAMPLE_SIDE, 1)
+    h, w = h - h % f, w - w % f
+    small = stack[:, :h, :w].reshape(len(stack), h // f, f, w // f, f, 3).mean(axis=(2, 4))
+    # Linearize after averaging, like encoders that run on a thumbnail
+    return _srgb_to_linear(small)
+
+
+@lru_cache(maxsize=8)
+def _bases(h: int, w: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Cosine bases (COMPONENTS_Y×h, COMPONENTS_X×w) and per-component normalization."""
+    by = np.cos(np.pi * np.arange(COMPONENTS_Y)[:, None] * np.arange(h)[None, :] / h) / h
+    bx = np.cos(np.pi * np.arange(COMPONENTS_X)[:, None] * np.arange(w)[None, :] / w) / w
+    norm = np.full((COMPONENTS_Y, COMPONENTS_X, 1), 2.0, dtype=np.float32)
+    norm[0, 0] = 1.0  # DC is the plain mean
+    return by.astype(np.float32), bx.astype(np.float32), norm
+
+
+def _encode(factors: np.ndarray) -> str:
+    """BlurHash string from one view's COMPONENTS_Y×COMPONENTS_X×3 factors."""
+    flat = factors.reshape(-1, 3)
+    dc, ac = flat[0], flat[1:]
+
+    size_flag = (COMPONENTS_X - 1) + (COMPONENTS_Y - 1) * 9
+    parts = [_base83(size_flag, 1)]
+
+    if len(ac):
+        quantised_max = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+    else:
+        quantised_max, max_value = 0, 1.0
+    parts.append(_base83(quantised_max, 1))
+
+    r, g, b = _linear_to_srgb(dc)
+    parts.append(_base83(int((r << 16) + (g << 8) + b), 4))
+
+    scaled = ac / max_value
+    q = np.clip(np.floor(np.sign(scaled) * np.abs(scaled) ** 0.5 * 9 + 9.5), 0, 18).astype(np.int64)
+    for qr, qg, qb in q:
+        parts.append(_base83(int(qr * 19 * 19 + qg * 19 + qb), 2))
+    return "".join(parts)
+
+
+def blurhash_images(images: dict[str, np.ndarray]) -> dict[str, str]:
+    """{view_name: BlurHash} for H×W×3 uint8 views; same-size views share one pass."""
+    by_size: dict[tuple[int, int], list[str]] = {}
+    for name, arr in images.items():
+        by_size.setdefault(arr.shape[:2], []).append(name)
+
+    hashes: dict[str, str] = {}
+    for names in by_size.values():
+        small = _downsample(np.stack([images[n][..., :3] for n in names]))
+        by, bx, norm = _bases(*small.shape[1:3])
+        factors = np.einsum("yh,xw,nhwc->nyxc", by, bx, small, optimize=True) * norm
+        for name, f in zip(names, factors):
+            hashes[name] = _encode(f)
+    return {name: hashes[name] for name in images}
@@ -0,0 +1,316 @@
+"""
+Worker-local two-tier cache of rendered views.
+
+Keys combine the style slug, renderer backend, output size and — only for
+backends that actually use them — head_scale / centroid quantized to
+RENDER_CACHE_QUANT plus a digest of the quantized FLAME codes and the hair
+mesh asset key. Reference and placeholder renders ignore the head, so one
+entry serves every job; reference keys include the photo's identity (its
+S3 key, size and mtime), so replacing a style's photo invalidates them.
+
+  memory — LRU of {view: H×W×3 uint8} within RENDER_CACHE_MEMORY_MB
+  disk   — one uncompressed .npz per key under RENDER_CACHE_DIR, LRU by
+           mtime within RENDER_CACHE_DISK_MB; survives worker restarts
+
+Cached arrays are read-only; consumers (the refiner) never modify inputs.
+
+The cache also counts how often each style is recommended per head shape,
+with each style's hair mesh key (persisted next to the disk tier).
+warm_up() pre-renders the most popular styles that are not cached yet; the
+worker calls it while the queue is idle. Head shape only ranks the styles:
+every warm-up render uses the default head (HeadParams()), so on the 3-D
+backends it serves jobs whose head is the default — DECA disabled or
+unavailable — while reference renders serve every job.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Callable
+
+import numpy as np
+
+from pipeline.head_mesh import N_EXPRESSION, N_SHAPE
+
+RENDER_CACHE_DIR = os.environ.get("RENDER_CACHE_DIR", "/tmp/render_cache")
+RENDER_CACHE_MEMORY_MB = int(os.environ.get("RENDER_CACHE_MEMORY_MB", "256"))
+RENDER_CACHE_DISK_MB = int(os.environ.get("RENDER_CACHE_DISK_MB", "2048"))
+RENDER_CACHE_QUANT = float(os.environ.get("RENDER_CACHE_QUANT", "0.05"))
+WARM_UP_TOP_N = int(os.environ.get("RENDER_CACHE_WARM_UP_TOP_N", "5"))
+
+# Backends whose output does not depend on the head
+_HEADLESS_BACKENDS = {"reference", "placeholder"}
+_POPULARITY_FILE = "popularity.json"
+
+
+def make_key(
+    slug: str,
+    backend: str,
+    size: int,
+    head_scale: float = 1.0,
+    head_centroid: list[float] | None = None,
+    head_shape: list[float] | None = None,
+    head_expression: list[float] | None = None,
+    mesh_key: str | None = None,
+    reference: str | None = None,
+) -> str:
+    """
+    Stable cache key (hex digest) for one style render. *reference*
+    identifies the reference photo a "reference" render is made from.
+    """
+    parts: list = [slug, backend, size]
+    if backend == "reference":
+        parts.append(reference)
+    elif backend not in _HEADLESS_BACKENDS:
+        q = lambda values: np.round(np.asarray(values, dtype=np.float64) / RENDER_CACHE_QUANT).astype(np.int32)
+        # Missing codes mean the mean head, same as zeros (head_mesh pads them)
+        codes = q(np.concatenate([_padded(head_shape, N_SHAPE), _padded(head_expression, N_EXPRESSION)]))
+        parts += [
+            int(q([head_scale])[0]),
+            q(head_centroid or [0, 0, 0]).tolist(),
+            hashlib.sha1(codes.tobytes()).hexdigest(),
+        ]
+        if mesh_key:
+            parts.append(mesh_key)
+    return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+
+def _padded(values: list[float] | None, size: int) -> np.ndarray:
+    out = np.zeros(size)
+    values = list(values or [])[:size]
+    out[:len(values)] = values
+    return out
+
+
+def _nbytes(images: dict[str, np.ndarray]) -> int:
+    return sum(a.nbytes for a in images.values())
+
+
+class RenderCache:
+    def __init__(
+        self,
+        cache_dir: str = RENDER_CACHE_DIR,
+        memory_bytes: int = RENDER_CACHE_MEMORY_MB * 2**20,
+        disk_bytes: int = RENDER_CACHE_DISK_MB * 2**20,
+    ):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: OrderedDict[str, dict[str, np.ndarray]] = OrderedDict()
+        self._memory_used = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()  # key → file size, LRU order
+        self._disk_used = 0
+        self._lock = threading.Lock()
+        self.stats = Counter()
+        self.popularity: dict[str, Counter] = {}
+        self.mesh_keys: dict[str, str | None] = {}  # slug → hair mesh asset key
+        self._scan_disk()
+
+    # ── Lookup / store ────────────────────────────────────────────────────────
+
+    def get(self, key: str) -> dict[str, np.ndarray] | None:
+        with self._lock:
+            images = self._memory.get(key)
+            if images is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return images
+            on_disk = key in self._disk
+
+        if on_disk:
+            try:
+                with np.load(self._path(key)) as data:
+                    images = {name: data[name] for name in data.files}
+                os.utime(self._path(key))
+            except (OSError, ValueError) as exc:
+                print(f"[render_cache] Dropping unreadable entry {key[:12]}: {exc}")
+                self._drop_disk(key)
+                images = None
+            if images is not None:
+                for a in images.values():
+                    a.flags.writeable = False
+                with self._lock:
+                    self._disk.move_to_end(key)
+                    self.stats["disk_hits"] += 1
+                    self._put_memory(key, images)
+                return images
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, images: dict[str, np.ndarray]) -> None:
+        images = {name: np.array(a, copy=True) for name, a in images.items()}
+        for a in images.values():
+            a.flags.writeable = False
+        with self._lock:
+            self._put_memory(key, images)
+        self._put_disk(key, images)
+
+    def _put_memory(self, key: str, images: dict[str, np.ndarray]) -> None:
+        if key in self._memory:
+            self._memory_used -= _nbytes(self._memory.pop(key))
+        self._memory[key] = images
+        self._memory_used += _nbytes(images)
+        while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= _nbytes(evicted)
+            self.stats["memory_evictions"] += 1
+
+    def _put_disk(self, key: str, images: dict[str, np.ndarray]) -> None:
+        path = self._path(key)
+        # Unique per process and thread: STYLE_POOL=process workers share the dir
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.savez(tmp, **images)
+            os.replace(tmp, path)
+            size = os.path.getsize(path)
+        except OSError as exc:
+            print(f"[render_cache] Could not write {path}: {exc}")
+            return
+        with self._lock:
+            self._disk_used += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+            victims = []
+            while self._disk_used > self.disk_bytes and len(self._disk) > 1:
+                victim, victim_size = self._disk.popitem(last=False)
+                self._disk_used -= victim_size
+                victims.append(victim)
+                self.stats["disk_evictions"] += 1
+        for victim in victims:
+            try:
+                os.unlink(self._path(victim))
+            except OSError:
+                pass
+
+    def _drop_disk(self, key: str) -> None:
+        with self._lock:
+            self._disk_used -= self._disk.pop(key, 0)
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _scan_disk(self) -> None:
+        """Index entries left by a previous worker, oldest first."""
+        try:
+            names = [n for n in os.listdir(self.cache_dir) if n.endswith(".npz") and ".tmp" not in n]
+        except OSError:
+            names = []
+        entries = []
+        for name in names:
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_used += size
+        self.popularity, self.mesh_keys = self._load_popularity()
+        if entries:
+            print(f"[render_cache] {len(entries)} cached renders on disk ({self._disk_used / 2**20:.0f} MiB)")
+
+    # ── Popularity + warm-up ──────────────────────────────────────────────────
+
+    def record_recommendations(self, head_shape: str, styles: dict[str, str | None]) -> None:
+        """Count one recommendation of each style; *styles* maps slug → mesh key."""
+        with self._lock:
+            self.popularity.setdefault(head_shape, Counter()).update(styles.keys())
+            self.mesh_keys.update(styles)
+            snapshot = {
+                "counts": {shape: dict(counts) for shape, counts in self.popularity.items()},
+                "mesh_keys": dict(self.mesh_keys),
+            }
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = os.path.join(
+                self.cache_dir, f"{_POPULARITY_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+            )
+            with open(tmp, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, os.path.join(self.cache_dir, _POPULARITY_FILE))
+        except OSError as exc:
+            print(f"[render_cache] Could not save popularity: {exc}")
+
+    def _load_popularity(self) -> tuple[dict[str, Counter], dict[str, str | None]]:
+        try:
+            with open(os.path.join(self.cache_dir, _POPULARITY_FILE)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}, {}
+        if "counts" not in data:
+            data = {"counts": data}  # written before mesh keys were recorded
+        counts = {shape: Counter(c) for shape, c in data["counts"].items()}
+        return counts, data.get("mesh_keys", {})
+
+    def popular_slugs(self, top_n: int = WARM_UP_TOP_N) -> list[str]:
+        """The top *top_n* styles of every head shape, most popular first."""
+        with self._lock:
+            ranked = [
+                (count, slug)
+                for counts in self.popularity.values()
+                for slug, count in counts.most_common(top_n)
+            ]
+        seen: dict[str, None] = {}
+        for _, slug in sorted(ranked, reverse=True):
+            seen.setdefault(slug)
+        return list(seen)
+
+    def warm_up(
+        self,
+        render: Callable[[str, str | None], object],
+        budget_seconds: float,
+        top_n: int = WARM_UP_TOP_N,
+    ) -> int:
+        """
+        Pre-render popular styles until *budget_seconds* is spent. *render*
+        renders one (slug, mesh key) through this cache; styles already
+        cached cost only a lookup. Returns how many styles were actually
+        rendered.
+        """
+        deadline = time.monotonic() + budget_seconds
+        rendered = 0
+        for slug in self.popular_slugs(top_n):
+            if time.monotonic() >= deadline:
+                break
+            before = self.stats["misses"]
+            with self._lock:
+                mesh_key = self.mesh_keys.get(slug)
+            render(slug, mesh_key)
+            if self.stats["misses"] > before:
+                rendered += 1
+        if rendered:
+            print(f"[render_cache] Warm-up rendered {rendered} popular styles")
+        return rendered
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_used,
+            }
+
+
+_CACHE: RenderCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_render_cache() -> RenderCache:
+    """Worker-wide cache, created on first use."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = RenderCache()
+        return _CACHE
@@ -3,20 +3,42 @@ Render 4 views (front, left, right, back) for a hairstyle.
 
 Priority order:
   1. Reference photo — use real hairstyle photo from catalog.json (resized to 512x512)
-  2. Trimesh/pyrender — CPU offscreen 3-D render (if RENDERER_BACKEND=trimesh)
+  2. 3-D render of head + hair meshes; the head is the personalized FLAME
+     mesh when a basis is installed (see head_mesh.py), a sphere otherwise;
+     the hair is the style's catalog mesh (mesh_assets.py) when it has one.
+       RENDERER_BACKEND=trimesh — pyrender on an OSMesa offscreen context
+                                  (default)
+       RENDERER_BACKEND=numpy   — the NumPy rasterizer (rasterizer.py), all
+                                  views in one batch, no GL needed; opt-in
+                                  for hosts without OSMesa or with
+                                  STYLE_POOL=process — it is slower than
+                                  pyrender per batch of views
   3. Placeholder — coloured PNG fallback
 
 catalog.json is written at startup by models/download_reference_images.py.
+
+render_images() returns the views as in-memory H×W×3 uint8 arrays, to be
+refined and uploaded without touching disk; render_views() is the older
+temp-PNG API on top of it.
 """
 from __future__ import annotations
 
 import json
 import os
 import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 
 import numpy as np
 
+from pipeline.head_mesh import build_head_mesh
+from pipeline.mesh_assets import get_mesh_assets
+from pipeline.rasterizer import RasterMesh, render_batch
+from pipeline.render_cache import get_render_cache, make_key
+
 try:
     import trimesh
     import trimesh.transformations as tf
@@ -30,6 +52,9 @@ try:
 except ImportError:
     _PYRENDER_AVAILABLE = False
 
+RENDERER_BACKEND = os.environ.get("RENDERER_BACKEND", "trimesh").lower()  # trimesh | numpy
+RENDER_CACHE_ENABLED = os.environ.get("RENDER_CACHE_ENABLED", "true").lower() == "true"
+
 # ── Reference catalog ─────────────────────────────────────────────────────────
 
 _CATALOG_PATH = Path("/app/hairstyle_references/catalog.json")
@@ -51,6 +76,12 @@ def _load_catalog() -> dict[str, dict]:
     return _REFERENCE_CATALOG
 
 
+def _reference_id(entry: dict, path: Path) -> str:
+    """Identity of a reference photo: its MinIO key (or path), size and mtime."""
+    st = path.stat()
+    return f"{entry.get('minio_key') or path}:{st.st_size}:{st.st_mtime_ns}"
+
+
 # ── View labels overlaid on reference photos ──────────────────────────────────
 
 _VIEW_LABELS: dict[str, str] = {
@@ -61,6 +92,7 @@ _VIEW_LABELS: dict[str, str] = {
 }
 
 VIEWS = ["front", "left", "right", "back"]
+VIEW_SIZE = 512
 
 
 # ── Public API ────────────────────────────────────────────────────────────────
@@ -69,30 +101,103 @@ def render_views(
     style_slug: str,
     head_scale: float = 1.0,
     head_centroid: list[float] | None = None,
+    head_shape: list[float] | None = None,
+    head_expression: list[float] | None = None,
+    mesh_key: str | None = None,
 ) -> dict[str, str]:
     """
     Returns {view_name: temp_png_path} for the 4 canonical views.
     Caller must delete temp files.
     """
+    from PIL import Image
+
+    result: dict[str, str] = {}
+    images = render_images(
+        style_slug, head_scale, head_centroid, head_shape, head_expression, mesh_key
+    )
+    for view_name, image in images.items():
+        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
+        Image.fromarray(image).save(tmp.name, format="PNG")
+        tmp.close()
+        result[view_name] = tmp.name
+    return result
+
+
+def render_images(
+    style_slug: str,
+    head_scale: float = 1.0,
+    head_centroid: list[float] | None = None,
+    head_shape: list[float] | None = None,
+    head_expression: list[float] | None = None,
+    mesh_key: str | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Returns {view_name: H×W×3 uint8 RGB array} for the 4 canonical views.
+    *head_shape* / *head_expression* are DECA's FLAME codes; *mesh_key* is
+    the style's catalog hair mesh, if any. Results are served from / stored
+    in the worker's render cache.
+    """
     catalog = _load_catalog()
 
+    reference = None
     if style_slug in catalog:
         local_path = catalog[style_slug].get("local_path")
         if local_path and Path(local_path).exists():
-            return _render_reference(style_slug, Path(local_path))
-        print(f"[renderer] Reference file missing for '{style_slug}': {local_path}")
-
-    backend = os.environ.get("RENDERER_BACKEND", "trimesh").lower()
-    if backend == "trimesh" and _TRIMESH_AVAILABLE and _PYRENDER_AVAILABLE:
-        return _render_trimesh(style_slug, head_scale, head_centroid or [0, 0, 0])
+            reference = Path(local_path)
+        else:
+            print(f"[renderer] Reference file missing for '{style_slug}': {local_path}")
+
+    if reference is not None:
+        backend = "reference"
+    elif RENDERER_BACKEND == "trimesh" and _TRIMESH_AVAILABLE and _PYRENDER_AVAILABLE:
+        backend = "trimesh"
+    elif RENDERER_BACKEND == "numpy" and _TRIMESH_AVAILABLE:
+        backend = "numpy"
+    else:
+        backend = "placeholder"
+
+    # Key (and render) by the hair actually used: if the catalog mesh can't be
+    # fetched this time, the sphere fallback must not be stored under its key
+    if mesh_key and backend in ("trimesh", "numpy") and get_mesh_assets().get(mesh_key) is None:
+        print(f"[renderer] Hair mesh unavailable for '{style_slug}' — using the sphere")
+        mesh_key = None
+
+    cache = get_render_cache() if RENDER_CACHE_ENABLED else None
+    key = None
+    if cache is not None:
+        key = make_key(
+            style_slug, backend, VIEW_SIZE,
+            head_scale, head_centroid, head_shape, head_expression, mesh_key,
+            _reference_id(catalog[style_slug], reference) if reference is not None else None,
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    if backend == "reference":
+        images = _render_reference(style_slug, reference)
+    elif backend in ("trimesh", "numpy"):
+        render = _render_trimesh if backend == "trimesh" else _render_numpy
+        images = render(
+            style_slug,
+            head_scale,
+            head_centroid or [0, 0, 0],
+            head_shape or [],
+            head_expression or [],
+            mesh_key,
+        )
+    else:
+        print(f"[renderer] Using placeholder for '{style_slug}'")
+        images = _render_placeholder(style_slug)
 
-    print(f"[renderer] Using placeholder for '{style_slug}'")
-    return _render_placeholder(style_slug)
+    if cache is not None:
+        cache.put(key, images)
+    return images
 
 
 # ── Reference image renderer ──────────────────────────────────────────────────
 
-def _render_reference(slug: str, source: Path) -> dict[str, str]:
+def _render_reference(slug: str, source: Path) -> dict[str, np.ndarray]:
     """
     Resize the reference photo to 512x512 and produce 4 view variants.
     Front = original. Left/Right/Back = same photo with a small corner label.
@@ -100,7 +205,7 @@ def _render_reference(slug: str, source: Path) -> dict[str, str]:
     from PIL import Image, ImageDraw, ImageFont
 
     base = Image.open(source).convert("RGB").resize((512, 512))
-    result: dict[str, str] = {}
+    result: dict[str, np.ndarray] = {}
 
     for view_name in VIEWS:
         img = base.copy()
@@ -114,66 +219,159 @@ def _render_reference(slug: str, source: Path) -> dict[str, str]:
             draw = ImageDraw.Draw(img)
             draw.text((8, 479), label, fill=(255, 255, 255))
 
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-        img.save(tmp.name, format="PNG")
-        tmp.close()
-        result[view_name] = tmp.name
+        result[view_name] = np.asarray(img)
 
     return result
 
 
 # ── Trimesh / pyrender 3-D renderer ──────────────────────────────────────────
-
-def _render_trimesh(
-    slug: str,
-    scale: float,
-    centroid: list[float],
-) -> dict[str, str]:
-    """Offscreen render with trimesh + pyrender."""
-    os.environ.setdefault("PYOPENGL_PLATFORM", "osmesa")
-
-    head_mesh = trimesh.creation.icosphere(radius=0.5 * scale)
-    hair_mesh = trimesh.creation.icosphere(radius=0.58 * scale)
-    hair_mesh.apply_translation([0, 0.05 * scale, 0])
-
+#
+# Each render thread keeps one OffscreenRenderer (OSMesa context + buffer)
+# for its whole life, across styles and jobs. Its scene holds the static
+# parts — head mesh, light, one camera — and is rebuilt only when the head
+# changes (a new job); between styles only the hair node is swapped, and
+# between views only the camera pose moves. pyrender binds mesh buffers to
+# the context that first draws them, so scenes are per thread too.
+
+_VIEW_YAWS = {"front": 0.0, "left": 90.0, "right": -90.0, "back": 180.0}
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_STATS = {"contexts_created": 0, "scenes_built": 0, "renders": 0, "render_seconds": 0.0}
+
+
+@dataclass
+class _SceneState:
+    head_key: tuple
+    scene: "pyrender.Scene"
+    camera_node: "pyrender.Node"
+    hair_key: tuple | None = None
+    hair_node: "pyrender.Node | None" = None
+
+
+def _count(key: str, amount: float = 1) -> None:
+    with _stats_lock:
+        _STATS[key] += amount
+
+
+def render_stats() -> dict:
+    """GL contexts created, scenes built and render times, worker-wide."""
+    with _stats_lock:
+        stats = dict(_STATS)
+    stats["render_seconds_avg"] = stats["render_seconds"] / stats["renders"] if stats["renders"] else 0.0
+    return stats
+
+
+def _thread_renderer() -> "pyrender.OffscreenRenderer":
+    renderer = getattr(_local, "renderer", None)
+    if renderer is None:
+        os.environ.setdefault("PYOPENGL_PLATFORM", "osmesa")
+        renderer = pyrender.OffscreenRenderer(VIEW_SIZE, VIEW_SIZE)
+        _local.renderer = renderer
+        _count("contexts_created")
+        print(f"[renderer] Created offscreen context for {threading.current_thread().name}")
+    return renderer
+
+
+def _head_mesh(scale: float, shape: list[float], expression: list[float]):
+    flame = build_head_mesh(shape, expression)
+    if flame is not None:
+        head_mesh = trimesh.Trimesh(flame.vertices * scale, flame.faces, process=False)
+    else:
+        head_mesh = trimesh.creation.icosphere(radius=0.5 * scale)
     head_mesh.visual.vertex_colors = [210, 180, 140, 255]
-    hair_mesh.visual.vertex_colors = [40, 30, 20, 200]
+    return head_mesh
 
+
+def _build_scene(
+    head_key: tuple,
+    scale: float,
+    shape: list[float],
+    expression: list[float],
+) -> _SceneState:
     scene = pyrender.Scene(ambient_light=[0.3, 0.3, 0.3])
-    scene.add(pyrender.Mesh.from_trimesh(head_mesh))
-    scene.add(pyrender.Mesh.from_trimesh(hair_mesh))
+    scene.add(pyrender.Mesh.from_trimesh(_head_mesh(scale, shape, expression)))
 
     light = pyrender.DirectionalLight(color=[1.0, 1.0, 1.0], intensity=3.0)
     scene.add(light, pose=np.eye(4))
 
-    renderer = pyrender.OffscreenRenderer(512, 512)
-    result: dict[str, str] = {}
+    camera_node = scene.add(pyrender.PerspectiveCamera(yfov=np.pi / 3.0), pose=np.eye(4))
+    _count("scenes_built")
+    return _SceneState(head_key, scene, camera_node)
+
+
+def _hair_key(mesh_key: str | None, scale: float) -> tuple:
+    return ("mesh", mesh_key, scale) if mesh_key else ("sphere", scale)
 
-    view_yaws = {"front": 0.0, "left": 90.0, "right": -90.0, "back": 180.0}
-    for view_name, yaw_deg in view_yaws.items():
-        camera = pyrender.PerspectiveCamera(yfov=np.pi / 3.0)
-        yaw_rad = np.radians(yaw_deg)
-        cam_x = 2.0 * np.sin(yaw_rad)
-        cam_z = 2.0 * np.cos(yaw_rad)
-        cam_pose = _look_at(
-            eye=np.array([cam_x, 0.1, cam_z]),
-            target=np.array([0.0, 0.0, 0.0]),
+
+def _hair_mesh(mesh_key: str | None, scale: float):
+    """
+    The catalog hair mesh at the LOD matching VIEW_SIZE, or the placeholder
+    sphere without a *mesh_key*. Raises if the mesh can't be fetched, so
+    nothing keyed by *mesh_key* (scene, lru_cache) ever holds the sphere.
+    """
+    if mesh_key:
+        asset = get_mesh_assets().get(mesh_key)
+        if asset is None:
+            raise RuntimeError(f"Hair mesh {mesh_key} is unavailable")
+        lod = asset.for_size(VIEW_SIZE, scale)
+        return trimesh.Trimesh(
+            np.asarray(lod.vertices) * scale,
+            np.asarray(lod.faces),
+            vertex_colors=np.asarray(lod.colors),
+            process=False,
         )
-        cam_node = scene.add(camera, pose=cam_pose)
-        color, _ = renderer.render(scene)
-        scene.remove_node(cam_node)
 
-        from PIL import Image
-        img = Image.fromarray(color)
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-        img.save(tmp.name)
-        tmp.close()
-        result[view_name] = tmp.name
+    hair_mesh = trimesh.creation.icosphere(radius=0.58 * scale)
+    hair_mesh.apply_translation([0, 0.05 * scale, 0])
+    hair_mesh.visual.vertex_colors = [40, 30, 20, 200]
+    return hair_mesh
+
+
+def _render_trimesh(
+    slug: str,
+    scale: float,
+    centroid: list[float],
+    shape: list[float],
+    expression: list[float],
+    mesh_key: str | None = None,
+) -> dict[str, np.ndarray]:
+    """Offscreen render with trimesh + pyrender on this thread's context."""
+    renderer = _thread_renderer()
+
+    head_key = (scale, tuple(shape), tuple(expression))
+    state: _SceneState | None = getattr(_local, "scene", None)
+    if state is None or state.head_key != head_key:
+        state = _build_scene(head_key, scale, shape, expression)
+        _local.scene = state
+
+    # Styles without a catalog mesh share the sphere — only rebuild when it changes
+    hair_key = _hair_key(mesh_key, scale)
+    if state.hair_key != hair_key:
+        hair = pyrender.Mesh.from_trimesh(_hair_mesh(mesh_key, scale))
+        if state.hair_node is not None:
+            state.scene.remove_node(state.hair_node)
+        state.hair_node = state.scene.add(hair)
+        state.hair_key = hair_key
+
+    result: dict[str, np.ndarray] = {}
+    for view_name, yaw_deg in _VIEW_YAWS.items():
+        state.scene.set_pose(state.camera_node, pose=_camera_pose(yaw_deg))
+        t0 = time.perf_counter()
+        color, _ = renderer.render(state.scene)
+        _count("render_seconds", time.perf_counter() - t0)
+        _count("renders")
+        result[view_name] = np.ascontiguousarray(color[..., :3])
 
-    renderer.delete()
     return result
 
 
+def _camera_pose(yaw_deg: float) -> np.ndarray:
+    yaw_rad = np.radians(yaw_deg)
+    eye = np.array([2.0 * np.sin(yaw_rad), 0.1, 2.0 * np.cos(yaw_rad)])
+    return _look_at(eye=eye, target=np.array([0.0, 0.0, 0.0]))
+
+
 def _look_at(eye: np.ndarray, target: np.ndarray) -> np.ndarray:
     forward = target - eye
     forward /= np.linalg.norm(forward)
@@ -189,19 +387,53 @@ def _look_at(eye: np.ndarray, target: np.ndarray) -> np.ndarray:
     return m
 
 
+# ── NumPy rasterizer ──────────────────────────────────────────────────────────
+#
+# Same scene as the pyrender path (head, hair, one directional light along
+# −z, ambient 0.3, 60° camera), rasterized for all views in one batch. Meshes
+# are kept per head / hair key, so consecutive styles of a job only rebuild
+# the hair.
+
+@lru_cache(maxsize=4)
+def _raster_head(scale: float, shape: tuple, expression: tuple) -> RasterMesh:
+    return RasterMesh.from_trimesh(_head_mesh(scale, list(shape), list(expression)))
+
+
+@lru_cache(maxsize=8)
+def _raster_hair(mesh_key: str | None, scale: float) -> RasterMesh:
+    return RasterMesh.from_trimesh(_hair_mesh(mesh_key, scale))
+
+
+def _render_numpy(
+    slug: str,
+    scale: float,
+    centroid: list[float],
+    shape: list[float],
+    expression: list[float],
+    mesh_key: str | None = None,
+) -> dict[str, np.ndarray]:
+    """All views in one render_batch() call."""
+    head = _raster_head(scale, tuple(shape), tuple(expression))
+    hair = _raster_hair(mesh_key, scale)
+    poses = np.stack([_camera_pose(yaw) for yaw in _VIEW_YAWS.values()])
+
+    t0 = time.perf_counter()
+    images = render_batch([head, hair], poses, VIEW_SIZE, yfov=np.pi / 3.0)
+    _count("render_seconds", time.perf_counter() - t0)
+    _count("renders", len(poses))
+    return dict(zip(_VIEW_YAWS, images))
+
+
 # ── Placeholder renderer ──────────────────────────────────────────────────────
 
-def _render_placeholder(slug: str) -> dict[str, str]:
+def _render_placeholder(slug: str) -> dict[str, np.ndarray]:
     from PIL import Image, ImageDraw
 
     colors = {"front": "#4A90D9", "left": "#7B68EE", "right": "#50C878", "back": "#FF7F50"}
-    result: dict[str, str] = {}
+    result: dict[str, np.ndarray] = {}
     for view_name, color in colors.items():
         img = Image.new("RGB", (512, 512), color)
         draw = ImageDraw.Draw(img)
         draw.text((20, 240), f"{slug}\n{view_name}", fill="white")
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-        img.save(tmp.name)
-        tmp.close()
-        result[view_name] = tmp.name
+        result[view_name] = np.asarray(img)
     return result
@@ -0,0 +1,141 @@
+"""
+Render → refine → upload for all selected styles as a bounded pipeline.
+
+Styles are rendered and refined on a pool of STYLE_WORKERS threads (or
+processes, with STYLE_POOL=process). As soon as a style's views are ready,
+each view is handed to a pool of UPLOAD_WORKERS upload threads sharing one
+S3 client and its connection pool, so PUTs overlap with rendering of the
+next styles. At most STYLE_QUEUE_DEPTH styles are in flight (rendering or
+uploading) at once, which bounds the views held in memory.
+
+Refinement also yields a BlurHash placeholder per view (placeholder.py),
+computed for all of a style's views in one batch and attached to its
+StoredView. Results come back in style order; the progress callback runs on the calling
+thread once per finished style, with the number finished so far.
+"""
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Callable
+
+import numpy as np
+
+from pipeline.placeholder import blurhash_images
+from pipeline.refiner import refine_images
+from pipeline.renderer import render_images
+from pipeline.uploader import UPLOAD_WORKERS, StoredView, upload_image
+
+STYLE_WORKERS = int(os.environ.get("STYLE_WORKERS", "2"))
+STYLE_POOL = os.environ.get("STYLE_POOL", "thread").lower()  # thread | process
+STYLE_QUEUE_DEPTH = int(os.environ.get("STYLE_QUEUE_DEPTH", str(STYLE_WORKERS * 2)))
+
+_render_pool: Executor | None = None
+_upload_pool: ThreadPoolExecutor | None = None
+_pools_lock = threading.Lock()
+
+
+def _pools() -> tuple[Executor, ThreadPoolExecutor]:
+    """Worker-wide pools, created on first use and kept across jobs."""
+    global _render_pool, _upload_pool
+    with _pools_lock:
+        if _render_pool is None:
+            if STYLE_POOL == "process":
+                # spawn: children must not inherit GL / MediaPipe state
+                _render_pool = ProcessPoolExecutor(
+                    max_workers=STYLE_WORKERS, mp_context=mp.get_context("spawn")
+                )
+            else:
+                _render_pool = ThreadPoolExecutor(
+                    max_workers=STYLE_WORKERS, thread_name_prefix="render"
+                )
+            _upload_pool = ThreadPoolExecutor(
+                max_workers=UPLOAD_WORKERS, thread_name_prefix="upload"
+            )
+        return _render_pool, _upload_pool
+
+
+def _render_style(
+    slug: str,
+    head: dict,
+    mesh_key: str | None = None,
+) -> tuple[dict[str, np.ndarray], dict[str, str]]:
+    """Render and refine one style's views (runs on the render pool)."""
+    views = refine_images(render_images(style_slug=slug, mesh_key=mesh_key, **head))
+    return views, blurhash_images(views)
+
+
+def render_and_upload(
+    job_id: str,
+    slugs: list[str],
+    head: dict,
+    on_style_done: Callable[[int], None] | None = None,
+    mesh_keys: list[str | None] | None = None,
+) -> list[dict[str, StoredView]]:
+    """
+    Render, refine and upload every style in *slugs*. *head* holds the
+    render_images() head keyword arguments; *mesh_keys* the styles' catalog
+    hair meshes, aligned with *slugs*. Returns {view_name: StoredView} per
+    style, in the order of *slugs*.
+    """
+    render_pool, upload_pool = _pools()
+    results: list[dict[str, StoredView]] = [{} for _ in slugs]
+    placeholders: list[dict[str, str]] = [{} for _ in slugs]
+    views_left = [0] * len(slugs)
+    inflight: dict[Future, tuple[str, int, str | None]] = {}
+    next_style = 0
+    styles_inflight = 0
+    done = 0
+
+    def submit_renders() -> None:
+        nonlocal next_style, styles_inflight
+        while next_style < len(slugs) and styles_inflight < max(STYLE_QUEUE_DEPTH, 1):
+            mesh_key = mesh_keys[next_style] if mesh_keys else None
+            future = render_pool.submit(_render_style, slugs[next_style], head, mesh_key)
+            inflight[future] = ("render", next_style, None)
+            next_style += 1
+            styles_inflight += 1
+
+    try:
+        submit_renders()
+        while inflight:
+            finished, _ = wait(list(inflight), return_when=FIRST_COMPLETED)
+            for future in finished:
+                kind, i, view_name = inflight.pop(future)
+                if kind == "render":
+                    views, placeholders[i] = future.result()
+                    results[i] = dict.fromkeys(views)  # keeps view order
+                    views_left[i] = len(views)
+                    for name, image in views.items():
+                        upload = upload_pool.submit(upload_image, image)
+                        inflight[upload] = ("upload", i, name)
+                    if views:
+                        continue
+                else:
+                    stored = future.result()
+                    stored.placeholder = placeholders[i].get(view_name, "")
+                    results[i][view_name] = stored
+                    views_left[i] -= 1
+                    if views_left[i]:
+                        continue
+
+                # Style i fully uploaded
+                styles_inflight -= 1
+                done += 1
+                if on_style_done is not None:
+                    on_style_done(done)
+                submit_renders()
+    finally:
+        for future in inflight:
+            future.cancel()
+
+    return results
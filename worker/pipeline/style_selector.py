@@ -28,6 +28,7 @@ class RankedStyle:
     barber_notes: str | None
     barber_guard: str | None
     top_length_cm: float | None
+    mesh_s3_key: str | None
 
 
 _SHAPE_COLUMN = {
@@ -83,7 +84,7 @@ def select_styles(
         SELECT
             id::text AS style_id,
             name, slug, texture, length, maintenance,
-            barber_notes, barber_guard, top_length_cm,
+            barber_notes, barber_guard, top_length_cm, mesh_s3_key,
             ({shape_col} {texture_bonus}) AS score
         FROM hairstyle_catalog
         {where_clause}
@@ -113,6 +114,7 @@ def select_styles(
                 barber_notes=row["barber_notes"],
                 barber_guard=row["barber_guard"],
                 top_length_cm=row["top_length_cm"],
+                mesh_s3_key=row["mesh_s3_key"],
             )
         )
 
@@ -1,10 +1,161 @@
-"""Upload rendered PNG views to MinIO results bucket."""
+"""
+Upload rendered views to MinIO results bucket.
+
+upload_images() encodes each in-memory view to PNG exactly once, into a
+BytesIO buffer, and sends it with put_object — no temp files. upload_views()
+is the older file-based API: it sends the PNG files as they are and deletes
+them. The S3 client is shared (boto3 clients are thread-safe) and its
+connection pool is sized for UPLOAD_WORKERS concurrent uploads.
+
+Storage is content-addressed: every image lives once under
+results/cas/{sha256}.{ext} and jobs only reference digests. Digests known to
+exist are kept in an in-memory LRU index of up to KNOWN_DIGESTS_MAX
+entries; an unknown digest gets a HEAD check before the PUT, so identical
+bytes (e.g. every reference render of a popular style) are uploaded only
+once per bucket. Since an object's bytes
+can never change, objects carry an immutable, year-long Cache-Control.
+
+Besides the PNG, each view is uploaded in the variants produced by
+encoder.encode_variants() (WebP / AVIF at full and thumbnail size).
+"""
 from __future__ import annotations
 
+import hashlib
 import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
 
 import boto3
+import numpy as np
 from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from pipeline.encoder import EncodedImage, encode_png, encode_variants
+
+URL_EXPIRY = 86400  # presigned GET URLs valid for 24h
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "8"))
+CAS_PREFIX = "results/cas"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Digests remembered as uploaded (LRU); older ones fall back to a HEAD check
+KNOWN_DIGESTS_MAX = int(os.environ.get("UPLOAD_KNOWN_DIGESTS_MAX", "100000"))
+
+_known_digests: OrderedDict[str, None] = OrderedDict()
+_known_lock = threading.Lock()
+_stats = {"puts": 0, "deduped": 0}
+
+
+@dataclass
+class StoredView:
+    """An uploaded view: its content digest, object key and presigned URL."""
+    digest: str
+    key: str
+    url: str
+    # Encoded variants: {format, width, height, bytes, digest, url}
+    variants: list[dict] = field(default_factory=list)
+    # BlurHash of the view, set by the style pipeline
+    placeholder: str = ""
+
+
+@lru_cache(maxsize=1)
+def _s3_client():
+    return boto3.client(
+        "s3",
+        endpoint_url=os.environ.get("MINIO_ENDPOINT", "http://minio:9000"),
+        aws_access_key_id=os.environ.get("MINIO_ACCESS_KEY", "minioadmin"),
+        aws_secret_access_key=os.environ.get("MINIO_SECRET_KEY", "minioadmin"),
+        region_name="us-east-1",
+        config=Config(signature_version="s3v4", max_pool_connections=UPLOAD_WORKERS),
+    )
+
+
+def _bucket() -> str:
+    return os.environ.get("MINIO_BUCKET_RESULTS", "hairstyle-results")
+
+
+def _exists(client, key: str) -> bool:
+    try:
+        client.head_object(Bucket=_bucket(), Key=key)
+        return True
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+def _put(encoded: EncodedImage) -> StoredView:
+    """Store encoded bytes content-addressed, skipping the PUT for known digests."""
+    client = _s3_client()
+    body = encoded.body
+    digest = hashlib.sha256(body).hexdigest()
+    key = f"{CAS_PREFIX}/{digest}.{encoded.extension}"
+
+    with _known_lock:
+        known = digest in _known_digests
+        if known:
+            _known_digests.move_to_end(digest)
+    if not known and not _exists(client, key):
+        client.put_object(
+            Bucket=_bucket(),
+            Key=key,
+            Body=body,
+            ContentType=encoded.content_type,
+            CacheControl=CACHE_CONTROL,
+        )
+        with _known_lock:
+            _stats["puts"] += 1
+    else:
+        with _known_lock:
+            _stats["deduped"] += 1
+    with _known_lock:
+        _known_digests[digest] = None
+        while len(_known_digests) > KNOWN_DIGESTS_MAX:
+            _known_digests.popitem(last=False)
+
+    url = client.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": _bucket(), "Key": key},
+        ExpiresIn=URL_EXPIRY,
+    )
+    return StoredView(digest, key, url)
+
+
+def upload_stats() -> dict[str, int]:
+    with _known_lock:
+        return {**_stats, "known_digests": len(_known_digests)}
+
+
+def upload_image(image: np.ndarray) -> StoredView:
+    """Encode and upload one in-memory view as PNG plus its configured variants."""
+    stored = _put(encode_png(image))
+    for encoded in encode_variants(image):
+        variant = _put(encoded)
+        stored.variants.append({
+            "format": encoded.format,
+            "width": encoded.width,
+            "height": encoded.height,
+            "bytes": len(encoded.body),
+            "digest": variant.digest,
+            "url": variant.url,
+        })
+    return stored
+
+
+def upload_images(
+    job_id: str,
+    style_slug: str,
+    images: dict[str, np.ndarray],
+) -> dict[str, str]:
+    """
+    Encode and upload each in-memory view (H×W×3 uint8).
+    Returns dict of {view_name: public_url}. *job_id* and *style_slug* no
+    longer affect storage (keys are content digests); kept for callers.
+    """
+    return {
+        view_name: upload_image(image).url
+        for view_name, image in images.items()
+    }
 
 
 def upload_views(
@@ -14,38 +165,19 @@ def upload_views(
 ) -> dict[str, str]:
     """
     Upload each view PNG to MinIO.
-    Returns dict of {view_name: public_url}.
+    Returns dict of {view_name: public_url}. *job_id* and *style_slug* are
+    unused since storage became content-addressed; kept for callers.
     """
-    endpoint = os.environ.get("MINIO_ENDPOINT", "http://minio:9000")
-    access = os.environ.get("MINIO_ACCESS_KEY", "minioadmin")
-    secret = os.environ.get("MINIO_SECRET_KEY", "minioadmin")
-    bucket = os.environ.get("MINIO_BUCKET_RESULTS", "hairstyle-results")
-
-    client = boto3.client(
-        "s3",
-        endpoint_url=endpoint,
-        aws_access_key_id=access,
-        aws_secret_access_key=secret,
-        region_name="us-east-1",
-        config=Config(signature_version="s3v4"),
-    )
-
     urls: dict[str, str] = {}
     for view_name, local_path in view_paths.items():
-        key = f"results/{job_id}/{style_slug}/{view_name}.png"
-        client.upload_file(
-            local_path,
-            bucket,
-            key,
-            ExtraArgs={"ContentType": "image/png"},
-        )
-        # Build a presigned GET URL valid for 24h
-        url = client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket, "Key": key},
-            ExpiresIn=86400,
-        )
-        urls[view_name] = url
+        with open(local_path, "rb") as f:
+            body = f.read()
+        h, w = _png_size(body)
+        urls[view_name] = _put(EncodedImage("png", w, h, body)).url
         os.unlink(local_path)
-
     return urls
+
+
+def _png_size(body: bytes) -> tuple[int, int]:
+    """(height, width) from a PNG's IHDR chunk."""
+    return int.from_bytes(body[20:24], "big"), int.from_bytes(body[16:20], "big")
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Tests import worker modules the way main.py does (pipeline.*, models.*)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Same offscreen GL platform as the worker image; must be set before pyrender loads
+os.environ.setdefault("PYOPENGL_PLATFORM", "osmesa")
@@ -0,0 +1,61 @@
+import importlib
+import io
+import os
+import tarfile
+
+import pytest
+
+
+def _tar(files: dict[str, bytes]) -> bytes:
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return out.getvalue()
+
+
+class _FakeS3:
+    def __init__(self):
+        self.tarball = b""
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.tarball)}
+
+
+@pytest.fixture
+def weights(monkeypatch, tmp_path):
+    """download_deca_weights with its directories under a temp HOME."""
+    from models import download_deca_weights
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    module = importlib.reload(download_deca_weights)
+    s3 = _FakeS3()
+    monkeypatch.setattr(module, "_s3_client", lambda: s3)
+    yield module, s3
+    monkeypatch.undo()
+    importlib.reload(download_deca_weights)
+
+
+def test_derived_files_survive_reinstall_and_follow_the_weights(weights):
+    module, s3 = weights
+    s3.tarball = _tar({"deca_model.tar": b"v1"})
+    module.download_if_needed()
+    first = module.derived_dir()
+    with open(os.path.join(first, "deca_model.mmap.pt"), "wb") as f:
+        f.write(b"derived")
+
+    # A damaged install is re-extracted and renamed over DECA_LOCAL_DIR
+    os.unlink(os.path.join(module.DECA_LOCAL_DIR, "deca_model.tar"))
+    module.download_if_needed()
+    assert module.derived_dir() == first
+    assert os.path.exists(os.path.join(first, "deca_model.mmap.pt"))
+    assert not first.startswith(module.DECA_LOCAL_DIR + os.sep)
+
+    # New weights get a fresh directory; the old one is pruned
+    s3.tarball = _tar({"deca_model.tar": b"v2"})
+    os.unlink(os.path.join(module.DECA_LOCAL_DIR, "deca_model.tar"))
+    module.download_if_needed()
+    assert module.derived_dir() != first
+    assert not os.path.exists(first)
@@ -0,0 +1,57 @@
+import io
+
+import pytest
+
+from pipeline import downloader
+
+
+class _Body(io.BytesIO):
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.reads = 0
+        self.consumed = 0
+
+    def read(self, amt=None):
+        self.reads += 1
+        chunk = super().read(amt)
+        self.consumed += len(chunk)
+        return chunk
+
+
+class _FakeS3:
+    def __init__(self, data: bytes, content_length: bool = True):
+        self.body = _Body(data)
+        self.response = {"Body": self.body}
+        if content_length:
+            self.response["ContentLength"] = len(data)
+
+    def get_object(self, Bucket, Key):
+        return self.response
+
+
+def _client(monkeypatch, s3):
+    monkeypatch.setattr(downloader, "_s3_client", lambda: s3)
+    return s3
+
+
+def test_download_bytes_within_limit(monkeypatch):
+    s3 = _client(monkeypatch, _FakeS3(b"x" * 3000))
+    monkeypatch.setattr(downloader, "_CHUNK_BYTES", 1024)
+    assert downloader.download_bytes("k", max_bytes=3000) == b"x" * 3000
+    assert s3.body.closed
+
+
+def test_download_bytes_rejects_by_content_length(monkeypatch):
+    s3 = _client(monkeypatch, _FakeS3(b"x" * 3000))
+    with pytest.raises(ValueError, match="too large"):
+        downloader.download_bytes("k", max_bytes=2999)
+    assert s3.body.reads == 0 and s3.body.closed
+
+
+def test_download_bytes_stops_streaming_past_the_limit(monkeypatch):
+    # No (or a lying) Content-Length: the read itself is capped
+    s3 = _client(monkeypatch, _FakeS3(b"x" * (1 << 20), content_length=False))
+    monkeypatch.setattr(downloader, "_CHUNK_BYTES", 1024)
+    with pytest.raises(ValueError, match="larger than 4096"):
+        downloader.download_bytes("k", max_bytes=4096)
+    assert s3.body.consumed == 4097 and s3.body.closed
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from pipeline import head_mesh
+from pipeline.head_mesh import (
+    EXPRESSION_OFFSET,
+    HEAD_MESH_QUANT,
+    N_EXPRESSION,
+    N_SHAPE,
+    FlameBasis,
+    build_head_mesh,
+)
+
+
+@pytest.fixture
+def basis():
+    rng = np.random.default_rng(0)
+    n_vertices = 40
+    v_template = rng.normal(size=(n_vertices, 3))
+    # Full FLAME layout: 300 shape components, then the expression ones
+    shapedirs = rng.normal(size=(n_vertices, 3, EXPRESSION_OFFSET + N_EXPRESSION)) * 0.01
+    faces = rng.integers(0, n_vertices, size=(60, 3))
+    return FlameBasis(v_template, shapedirs, faces), v_template, shapedirs
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    head_mesh._CACHE.clear()
+    yield
+    head_mesh._CACHE.clear()
+
+
+def test_basis_product_matches_per_vertex_sum(basis):
+    flame, v_template, shapedirs = basis
+    rng = np.random.default_rng(1)
+    shape = rng.normal(size=N_SHAPE)
+    expression = rng.normal(size=N_EXPRESSION)
+
+    expected = v_template.copy()
+    for v in range(len(v_template)):
+        for k in range(N_SHAPE):
+            expected[v] += shape[k] * shapedirs[v, :, k]
+        for k in range(N_EXPRESSION):
+            expected[v] += expression[k] * shapedirs[v, :, EXPRESSION_OFFSET + k]
+    expected = (expected - v_template.mean(axis=0)) * flame.unit
+
+    got = flame.vertices(np.concatenate([shape, expression]))
+    np.testing.assert_allclose(got, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_quantized_cache_hit_returns_identical_vertices(basis):
+    flame = basis[0]
+    shape = [0.31, -0.52]
+    expression = [0.12]
+
+    first = build_head_mesh(shape, expression, flame)
+    # Within half a quantization step: same key, served from the cache
+    nudged = build_head_mesh([s + HEAD_MESH_QUANT * 0.2 for s in shape], expression, flame)
+    assert nudged is first
+    assert head_mesh.cache_stats()["size"] == 1
+
+    # A rebuild from the same coefficients produces the same vertices
+    head_mesh._CACHE.clear()
+    rebuilt = build_head_mesh(shape, expression, flame)
+    assert rebuilt is not first
+    np.testing.assert_array_equal(rebuilt.vertices, first.vertices)
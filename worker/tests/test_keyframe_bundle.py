@@ -0,0 +1,100 @@
+import io
+import json
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+
+from pipeline import frame_selector
+from pipeline.keyframe_bundle import load_keyframes
+from pipeline.landmarks import LandmarkCache
+
+
+def _jpeg(width: int, height: int) -> bytes:
+    image = np.full((height, width, 3), 128, dtype=np.uint8)
+    ok, buf = cv2.imencode(".jpg", image)
+    assert ok
+    return buf.tobytes()
+
+
+def _bundle(sizes: list[tuple[int, int]]) -> bytes:
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as zf:
+        frames = []
+        for i, (w, h) in enumerate(sizes):
+            name = f"{i:03d}.jpg"
+            zf.writestr(name, _jpeg(w, h))
+            frames.append({"file": name, "yaw": -30.0 + 20 * i})
+        zf.writestr("manifest.json", json.dumps({"frames": frames}))
+    return out.getvalue()
+
+
+class _SharedBufferPool:
+    """Stands in for LandmarkPool: packs each batch into one N×H×W×C array."""
+
+    batch_size = 4
+
+    def __init__(self):
+        self.batches: list[tuple[int, ...]] = []
+
+    def landmark(self, images):
+        frames = np.empty((len(images),) + images[0].shape, dtype=np.uint8)
+        for i, image in enumerate(images):
+            frames[i] = image
+        self.batches.append(frames.shape)
+        return [None] * len(images)
+
+
+def test_mixed_orientation_bundle_is_landmarked_per_shape():
+    frames = load_keyframes(_bundle([(480, 640), (640, 480), (480, 640), (640, 480)]))
+    assert [f.image.shape for f in frames] == [
+        (640, 480, 3), (480, 640, 3), (640, 480, 3), (480, 640, 3),
+    ]
+
+    pool = _SharedBufferPool()
+    landmarks = LandmarkCache()
+    bins = frame_selector._FrameBins()
+    frame_selector._score_into(bins, iter(frames), None, landmarks, pool)
+
+    assert sorted(pool.batches) == [(2, 480, 640, 3), (2, 640, 480, 3)]
+    assert bins.seen == len(frames)
+
+
+def _zip(members: dict[str, bytes]) -> bytes:
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return out.getvalue()
+
+
+def test_rejects_bundle_that_unpacks_past_the_limit(monkeypatch):
+    monkeypatch.setattr("pipeline.keyframe_bundle.MAX_UNPACKED_BYTES", 1 << 20)
+    data = _zip({"000.jpg": b"\0" * (4 << 20)})
+    assert len(data) < 1 << 20
+    with pytest.raises(ValueError, match="unpacks to more than"):
+        load_keyframes(data)
+
+
+@pytest.mark.parametrize("manifest", [b"[1, 2]", b'{"frames": {"file": "a"}}', b'{"frames": [1]}', b"{"])
+def test_rejects_malformed_manifest(manifest):
+    with pytest.raises(ValueError, match="manifest"):
+        load_keyframes(_zip({"manifest.json": manifest, "000.jpg": _jpeg(8, 8)}))
+
+
+@pytest.mark.parametrize("value", [None, 0, 1.5])
+def test_null_or_numeric_manifest_numbers_are_accepted(value):
+    manifest = json.dumps({"frames": [{"file": "000.jpg", "timestamp": value, "yaw": value}]})
+    frames = load_keyframes(_zip({"manifest.json": manifest, "000.jpg": _jpeg(8, 8)}))
+    expected = 0.0 if value is None else float(value)
+    assert frames[0].timestamp == expected
+    assert frames[0].yaw_hint == (None if value is None else expected)
+
+
+@pytest.mark.parametrize("field", ["timestamp", "yaw"])
+@pytest.mark.parametrize("value", ["1.0", True, [1], {"s": 1}, 1e400, 10**400])
+def test_rejects_non_numeric_manifest_numbers(field, value):
+    manifest = json.dumps({"frames": [{"file": "000.jpg", field: value}]})
+    with pytest.raises(ValueError, match=field):
+        load_keyframes(_zip({"manifest.json": manifest, "000.jpg": _jpeg(8, 8)}))
@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("mediapipe")
+
+from pipeline.landmark_pool import LandmarkPool
+
+
+def test_warm_up_starts_every_process():
+    pool = LandmarkPool(workers=3)
+    try:
+        pids = pool.warm_up(timeout=60)
+        assert len(set(pids)) == 3
+        # Warmed processes still landmark (no face in a blank frame)
+        assert pool.landmark([np.zeros((64, 64, 3), dtype=np.uint8)] * 2) == [None, None]
+    finally:
+        pool.close()
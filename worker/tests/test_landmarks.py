@@ -0,0 +1,72 @@
+import numpy as np
+
+from pipeline.landmarks import LANDMARK_COUNT, LandmarkCache
+
+
+def _points(value: float) -> np.ndarray:
+    return np.full((LANDMARK_COUNT, 3), value, dtype=np.float32)
+
+
+def test_discarded_frames_are_landmarked_again_without_clobbering_others():
+    cache = LandmarkCache(capacity=2)
+    cache.put(0, _points(0.1), (320, 180))
+    cache.put(1, _points(0.2), (320, 180))
+    cache.put(2, None, (320, 180))
+
+    # Proxy landmarks of the winners are dropped before analysis
+    cache.discard([0, 2])
+    assert 0 not in cache and 2 not in cache
+
+    cache.put(0, _points(0.5), (1920, 1080))
+    cache.put(2, _points(0.25), (1920, 1080))
+    np.testing.assert_allclose(cache.pixels([1])[0, 0], [64.0, 36.0, 64.0])
+    np.testing.assert_allclose(cache.pixels([0])[0, 0], [960.0, 540.0, 960.0])
+    assert cache.has_face(2)
+
+
+class _VideoMesh:
+    def __init__(self):
+        self.resets = 0
+
+    def reset(self):
+        self.resets += 1
+
+
+def _tracker(monkeypatch, boxes):
+    """FaceTracker whose detections are 20 px faces at the given centres."""
+    from pipeline import landmarks
+
+    centres = iter(boxes)
+
+    def detect(image, mesh):
+        cx, cy = next(centres)
+        h, w = image.shape[:2]
+        points = np.zeros((LANDMARK_COUNT, 3), dtype=np.float32)
+        points[::2, :2] = [(cx - 10) / w, (cy - 10) / h]
+        points[1::2, :2] = [(cx + 10) / w, (cy + 10) / h]
+        return points
+
+    monkeypatch.setattr(landmarks, "detect_landmarks", detect)
+    tracker = landmarks.FaceTracker.__new__(landmarks.FaceTracker)
+    tracker.tracking = True
+    tracker.static_mesh = object()
+    tracker.video_mesh = _VideoMesh()
+    tracker.window = None
+    tracker.redetections = 0
+    return tracker
+
+
+def test_video_mesh_is_reset_when_the_crop_window_moves(monkeypatch):
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    # Full-frame detection, then crop-relative detections: the face stays
+    # centred in the crop, then drifts to its edge
+    tracker = _tracker(monkeypatch, [(200, 200), (20, 20), (20, 20), (32, 20)])
+
+    tracker.process(image)  # window placed around the face
+    first = tracker.window
+    assert tracker.video_mesh.resets == 1
+    tracker.process(image)
+    tracker.process(image)
+    assert tracker.window == first and tracker.video_mesh.resets == 1
+    tracker.process(image)  # face near the crop edge: window moves
+    assert tracker.window != first and tracker.video_mesh.resets == 2
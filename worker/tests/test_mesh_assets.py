@@ -0,0 +1,70 @@
+import json
+import os
+
+import numpy as np
+import trimesh
+
+from pipeline import mesh_assets
+from pipeline.mesh_assets import VIEW_EXTENT, MeshAsset, MeshAssetCache, MeshLOD
+
+
+def _lod(cell: float) -> MeshLOD:
+    return MeshLOD(cell, np.zeros((0, 3), np.float32), np.zeros((0, 3), np.int32), np.zeros((0, 4), np.uint8))
+
+
+def test_for_size_picks_the_coarsest_lod_under_a_pixel():
+    pixel_512 = VIEW_EXTENT / 512
+    asset = MeshAsset("hair.obj", [_lod(0.0), _lod(pixel_512), _lod(2 * pixel_512), _lod(4 * pixel_512)])
+    assert asset.for_size(512).cell == pixel_512
+    assert asset.for_size(256).cell == 2 * pixel_512
+    assert asset.for_size(512, scale=0.5).cell == 2 * pixel_512
+    assert asset.for_size(1024).cell == 0.0
+
+
+def _obj() -> bytes:
+    # Small enough that a 1 px cell merges vertices
+    sphere = trimesh.creation.icosphere(subdivisions=4, radius=0.05)
+    return trimesh.exchange.obj.export_obj(sphere).encode()
+
+
+def test_assets_are_rebuilt_when_the_lod_configuration_changes(tmp_path, monkeypatch):
+    body = _obj()
+    fetches = []
+
+    def cache():
+        c = MeshAssetCache(str(tmp_path))
+        c._fetch_s3 = lambda key: fetches.append(key) or body
+        return c
+
+    asset = cache().get("hair/dome.obj")
+    assert [lod.cell for lod in asset.lods] == [0.0] + mesh_assets.lod_cells()
+    assert len(asset.lods[1].faces) < len(asset.lods[0].faces)
+
+    # Same configuration after a restart: served from disk, memory-mapped
+    again = cache().get("hair/dome.obj")
+    assert len(fetches) == 1
+    assert isinstance(again.lods[0].vertices, np.memmap)
+
+    monkeypatch.setattr(mesh_assets, "MESH_LOD_PIXELS", [1.0, 4.0])
+    rebuilt = cache().get("hair/dome.obj")
+    assert len(fetches) == 2
+    assert [lod.cell for lod in rebuilt.lods] == [0.0] + mesh_assets.lod_cells()
+    (entry,) = os.listdir(tmp_path)
+    with open(tmp_path / entry / "meta.json") as f:
+        assert json.load(f)["lod_cells"] == mesh_assets.lod_cells()
+
+
+def test_failed_keys_are_not_refetched_until_the_ttl_expires(tmp_path, monkeypatch):
+    cache = MeshAssetCache(str(tmp_path))
+    fetches = []
+    cache._fetch_s3 = lambda key: fetches.append(key) or b"not a mesh"
+
+    assert cache.get("hair/broken.obj") is None
+    assert cache.get("hair/broken.obj") is None
+    assert len(fetches) == 1
+    assert cache._key_locks == {}
+
+    clock = mesh_assets.time.monotonic() + mesh_assets.MESH_FAILURE_TTL + 1
+    monkeypatch.setattr(mesh_assets.time, "monotonic", lambda: clock)
+    assert cache.get("hair/broken.obj") is None
+    assert len(fetches) == 2
@@ -0,0 +1,57 @@
+import numpy as np
+
+from pipeline.rasterizer import RasterMesh, render_batch
+
+SIZE = 32
+WHITE = (255, 255, 255)
+
+
+def _quad(half: float, z: float, color, flip: bool = False) -> RasterMesh:
+    vertices = np.array(
+        [[-half, -half, z], [half, -half, z], [half, half, z], [-half, half, z]], dtype=np.float32
+    )
+    faces = np.array([[0, 1, 2], [0, 2, 3]], dtype=np.int32)
+    if flip:
+        faces = faces[:, ::-1].copy()
+    normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (4, 1))
+    colors = np.tile(np.array([*color, 1.0], dtype=np.float32), (4, 1))
+    return RasterMesh(vertices, faces, normals, colors)
+
+
+def _render(meshes, poses=None) -> np.ndarray:
+    poses = np.eye(4)[None] if poses is None else poses
+    # 90° field of view: at distance 2 the view spans [-2, 2]
+    return render_batch(meshes, poses, SIZE, yfov=np.pi / 2)
+
+
+def _covered(image: np.ndarray) -> np.ndarray:
+    return (image != WHITE).any(axis=-1)
+
+
+def test_silhouette_of_a_quad():
+    image = _render([_quad(1.0, -2.0, (1.0, 0.0, 0.0))])[0]
+    expected = np.zeros((SIZE, SIZE), dtype=bool)
+    expected[SIZE // 4:3 * SIZE // 4, SIZE // 4:3 * SIZE // 4] = True
+    np.testing.assert_array_equal(_covered(image), expected)
+
+
+def test_nearest_surface_wins_regardless_of_order():
+    near = _quad(0.5, -2.0, (1.0, 0.0, 0.0))
+    far = _quad(1.5, -3.0, (0.0, 0.0, 1.0))
+    for meshes in ([near, far], [far, near]):
+        image = _render(meshes)[0]
+        centre, border = image[SIZE // 2, SIZE // 2], image[SIZE // 2, SIZE // 4]
+        assert centre[0] > 0 and centre[2] == 0
+        assert border[2] > 0 and border[0] == 0
+
+
+def test_back_faces_are_culled():
+    assert not _covered(_render([_quad(1.0, -2.0, (1.0, 0.0, 0.0), flip=True)])[0]).any()
+
+    # The same front-facing quad seen from behind, in the same batch
+    behind = np.eye(4)
+    behind[:3, :3] = np.diag([-1.0, 1.0, -1.0])  # 180° about y
+    behind[:3, 3] = [0.0, 0.0, -4.0]
+    front, back = _render([_quad(1.0, -2.0, (1.0, 0.0, 0.0))], np.stack([np.eye(4), behind]))
+    assert _covered(front).any()
+    assert not _covered(back).any()
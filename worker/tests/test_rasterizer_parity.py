@@ -0,0 +1,39 @@
+"""
+Pixel parity of the NumPy rasterizer with the pyrender path, on the scenes
+of benchmarks/parity_rasterizer.py. Skipped where pyrender has no working
+offscreen context (the worker image runs it on OSMesa).
+"""
+import pytest
+
+from pipeline import renderer
+
+# pyrender multisamples edges and adds a weak specular lobe the rasterizer
+# leaves out, so allow a pixel of edge blending and ~2 levels of mean error
+MIN_IOU = 0.98
+MAX_MEAN = 2.0
+
+
+@pytest.fixture(scope="module")
+def scenes():
+    if not (renderer._TRIMESH_AVAILABLE and renderer._PYRENDER_AVAILABLE):
+        pytest.skip("pyrender is not importable on this platform")
+    try:
+        renderer._thread_renderer()
+    except Exception as exc:
+        pytest.skip(f"no offscreen GL context: {exc}")
+    from benchmarks import parity_rasterizer
+
+    found = list(parity_rasterizer._style_scenes([0.9, 1.0, 1.1]))
+    found += list(parity_rasterizer._occlusion_scene())
+    return {name: (reference, candidate) for name, reference, candidate, _, _ in found}
+
+
+@pytest.mark.parametrize("scene", ["style-0.9", "style-1", "style-1.1", "occlusion"])
+def test_numpy_backend_matches_pyrender(scenes, scene):
+    from benchmarks.parity_rasterizer import _compare
+
+    reference, candidate = scenes[scene]
+    for view in reference:
+        m = _compare(reference[view], candidate[view])
+        assert m["iou"] >= MIN_IOU, f"{scene}/{view}: {m}"
+        assert m["mean"] <= MAX_MEAN, f"{scene}/{view}: {m}"
@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+
+from pipeline.head_fitter import HeadParams
+from pipeline.render_cache import RenderCache, make_key
+
+
+def test_reference_key_tracks_the_photo():
+    a = make_key("bob", "reference", 512, reference="female/bob.jpg:1000:1")
+    b = make_key("bob", "reference", 512, reference="female/bob.jpg:1200:2")
+    assert a != b
+    # The head still doesn't matter for a reference render
+    assert a == make_key("bob", "reference", 512, 1.3, [0.1, 0, 0], reference="female/bob.jpg:1000:1")
+
+
+def _job_key(slug: str, mesh_key: str | None) -> str:
+    """The key render_images() computes for a job with a default DECA head."""
+    head = HeadParams()
+    return make_key(
+        slug, "numpy", 512,
+        head.scale, head.centroid, head.shape, head.expression, mesh_key,
+    )
+
+
+def test_default_head_codes_match_missing_codes():
+    assert make_key("bob", "numpy", 512) == _job_key("bob", None)
+    assert make_key("bob", "numpy", 512, head_shape=[0.5]) != _job_key("bob", None)
+
+
+def test_warm_up_renders_with_recorded_mesh_keys(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    cache.record_recommendations("oval", {"bob": "hair/bob.glb", "crop": None})
+    cache.record_recommendations("oval", {"bob": "hair/bob.glb"})
+
+    # Reloaded from disk, as after a worker restart
+    cache = RenderCache(str(tmp_path))
+    calls = []
+
+    def render(slug, mesh_key):
+        # What main._warm_up_render → render_images(slug, mesh_key=...) keys
+        calls.append((slug, mesh_key))
+        key = make_key(slug, "numpy", 512, mesh_key=mesh_key)
+        if cache.get(key) is None:
+            cache.put(key, {"front": np.zeros((2, 2, 3), dtype=np.uint8)})
+
+    assert cache.warm_up(render, budget_seconds=10) == 2
+    assert calls == [("bob", "hair/bob.glb"), ("crop", None)]
+    # Jobs with the default head hit the warmed entries
+    assert cache.get(_job_key("bob", "hair/bob.glb")) is not None
+    assert cache.get(_job_key("crop", None)) is not None
+    assert cache.warm_up(render, budget_seconds=10) == 0
+
+
+def test_loads_popularity_written_without_mesh_keys(tmp_path):
+    (tmp_path / "popularity.json").write_text(json.dumps({"round": {"crop": 3}}))
+    cache = RenderCache(str(tmp_path))
+    assert cache.popular_slugs() == ["crop"]
+    assert cache.mesh_keys == {}
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+import trimesh
+
+from pipeline import renderer
+from pipeline.head_fitter import HeadParams
+from pipeline.mesh_assets import MeshAsset, MeshLOD
+from pipeline.render_cache import RenderCache
+
+
+class _FlakyAssets:
+    """Mesh cache whose first fetch fails, like a transient S3 error."""
+
+    def __init__(self, asset: MeshAsset):
+        self.asset = asset
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        return None if self.calls == 1 else self.asset
+
+
+class _Assets:
+    """Mesh cache that always has the asset."""
+
+    def __init__(self, asset: MeshAsset):
+        self.asset = asset
+
+    def get(self, key):
+        return self.asset
+
+
+def _box_asset() -> MeshAsset:
+    box = trimesh.creation.box(extents=[1.4, 0.4, 1.4])
+    box.apply_translation([0, 0.45, 0])
+    lod = MeshLOD(
+        0.0,
+        np.asarray(box.vertices, dtype=np.float32),
+        np.asarray(box.faces, dtype=np.int32),
+        np.tile(np.array([200, 40, 40, 255], dtype=np.uint8), (len(box.vertices), 1)),
+    )
+    return MeshAsset("hair/box.glb", [lod])
+
+
+@pytest.fixture
+def numpy_renderer(monkeypatch, tmp_path):
+    monkeypatch.setattr(renderer, "RENDERER_BACKEND", "numpy")
+    monkeypatch.setattr(renderer, "VIEW_SIZE", 64)
+    monkeypatch.setattr(renderer, "_load_catalog", lambda: {})
+    cache = RenderCache(str(tmp_path))
+    monkeypatch.setattr(renderer, "get_render_cache", lambda: cache)
+    renderer._raster_hair.cache_clear()
+    yield cache
+    renderer._raster_hair.cache_clear()
+
+
+def test_fallback_sphere_is_not_cached_under_the_mesh_key(numpy_renderer, monkeypatch):
+    assets = _FlakyAssets(_box_asset())
+    monkeypatch.setattr(renderer, "get_mesh_assets", lambda: assets)
+
+    fallback = renderer.render_images("box-cut", mesh_key="hair/box.glb")
+    sphere = renderer.render_images("box-cut")
+    assert numpy_renderer.stats["misses"] == 1  # the sphere render was keyed as one
+
+    # Once the fetch works the style renders its mesh, not the cached sphere
+    meshed = renderer.render_images("box-cut", mesh_key="hair/box.glb")
+    assert numpy_renderer.stats["misses"] == 2
+    np.testing.assert_array_equal(fallback["front"], sphere["front"])
+    assert not np.array_equal(meshed["front"], sphere["front"])
+
+
+def test_warm_up_render_is_hit_by_a_default_head_job(numpy_renderer, monkeypatch):
+    monkeypatch.setattr(renderer, "get_mesh_assets", lambda: _Assets(_box_asset()))
+
+    # What main._warm_up_render renders for a popular style with a mesh
+    renderer.render_images("box-cut", mesh_key="hair/box.glb")
+
+    # The job path: render_and_upload passes the HeadParams fields as **head
+    head = HeadParams()
+    renderer.render_images(
+        style_slug="box-cut",
+        mesh_key="hair/box.glb",
+        head_scale=head.scale,
+        head_centroid=head.centroid,
+        head_shape=head.shape,
+        head_expression=head.expression,
+    )
+    assert numpy_renderer.stats["misses"] == 1
+    assert numpy_renderer.stats["memory_hits"] == 1
@@ -0,0 +1,65 @@
+import numpy as np
+
+from pipeline import uploader
+from pipeline.encoder import EncodedImage
+
+
+class _FakeS3:
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+        self.heads = 0
+
+    def head_object(self, Bucket, Key):
+        self.heads += 1
+        if Key not in self.objects:
+            from botocore.exceptions import ClientError
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+    def generate_presigned_url(self, method, Params, ExpiresIn):
+        return f"https://minio/{Params['Key']}"
+
+
+def test_known_digests_are_capped_lru(monkeypatch):
+    s3 = _FakeS3()
+    monkeypatch.setattr(uploader, "_s3_client", lambda: s3)
+    monkeypatch.setattr(uploader, "KNOWN_DIGESTS_MAX", 2)
+    monkeypatch.setattr(uploader, "_known_digests", type(uploader._known_digests)())
+
+    images = [EncodedImage("png", 1, 1, bytes([i])) for i in range(3)]
+    stored = [uploader._put(image) for image in images]
+    assert len(s3.objects) == 3
+    assert list(uploader._known_digests) == [stored[1].digest, stored[2].digest]
+
+    # An evicted digest costs a HEAD again, but is still not re-uploaded
+    heads = s3.heads
+    again = uploader._put(images[0])
+    assert again.key == stored[0].key
+    assert s3.heads == heads + 1
+    assert len(s3.objects) == 3
+    assert len(uploader._known_digests) == 2
+
+
+def test_upload_image_stores_png_and_variants(monkeypatch):
+    s3 = _FakeS3()
+    monkeypatch.setattr(uploader, "_s3_client", lambda: s3)
+    stored = uploader.upload_image(np.zeros((64, 64, 3), dtype=np.uint8))
+    assert stored.key.endswith(".png")
+    assert stored.key in s3.objects
+    assert all(v["url"].startswith("https://minio/") for v in stored.variants)
+
+
+def test_file_based_shim_keeps_its_signature(monkeypatch, tmp_path):
+    from PIL import Image
+
+    s3 = _FakeS3()
+    monkeypatch.setattr(uploader, "_s3_client", lambda: s3)
+    path = tmp_path / "front.png"
+    Image.new("RGB", (8, 4)).save(path)
+
+    urls = uploader.upload_views("job-1", "bob", {"front": str(path)})
+    assert urls["front"].endswith(".png")
+    assert not path.exists()
+    assert uploader.upload_images("job-1", "bob", {"front": np.zeros((4, 8, 3), np.uint8)})